@@ -14,9 +14,14 @@ from artiq.coredevice.ad9910 import (
         RAM_DEST_POW, RAM_DEST_POWASF, RAM_MODE_BIDIR_RAMP, RAM_MODE_CONT_BIDIR_RAMP, RAM_MODE_CONT_RAMPUP, RAM_MODE_RAMPUP, 
         RAM_DEST_ASF, RAM_DEST_FTW, RAM_MODE_DIRECTSWITCH
     )
-from sipyco.pc_rpc import Client
 from artiq.dashboard.drift_tracker import client_config as dt_config
 from artiq.readout_analysis import readouts
+from artiq.readout_analysis.pmt_threshold_calibrator import online_threshold_calibrator
+from artiq.applets.rcg import RealComplicatedGrapherConfig as rcg_config
+from artiq.applets.rcg.plot_bus import busPublisher
+from artiq.applets.rcg.queued_client import queuedClient, rcg_coalesce
+from artiq.applets.rcg.swmr import write_points
+from artiq.dashboard.vault_mirror import load_parameters
 from easydict import EasyDict as edict
 from datetime import datetime
 from bisect import bisect
@@ -131,15 +136,13 @@ class PulseSequence(EnvExperiment):
                                         tls_mode="off"
                                     )
         self.sd_tracker = self.global_cxn.sd_tracker_global
-        p = cxn.parametervault
-        collections = p.get_collections()
+        # From the vault mirror if it runs, which doesn't download them again
+        parameters, self.vault_version = load_parameters(cxn, dt_config.vault_mirror_socket)
         D = dict()
-        for collection in collections:
+        for collection, params in parameters.items():
             d = dict()
-            names = p.get_parameter_names(collection)
-            for name in names:
+            for name, param in params.items():
                 try:
-                    param = p.get_parameter([collection, name])
                     try:
                         units = param.units
                         if units == "":
@@ -180,15 +183,15 @@ class PulseSequence(EnvExperiment):
             self.att_list.append(float(settings[1][3]))
             self.state_list.append(bool(float(settings[1][2])))
 
-        # Try to make rcg/hist connections
-        try:
-            self.rcg = Client("::1", 3286, "rcg")
-        except:
-            self.rcg = None
-        try:
-            self.pmt_hist = Client("::1", 3287, "pmt_histogram")
-        except:
-            self.pmt_hist = None
+        # rcg/hist connections, made in the background so that a slow or
+        # missing grapher never stalls the experiment
+        if rcg_config.plot_bus:
+            self.rcg = busPublisher()
+        else:
+            self.rcg = queuedClient("::1", 3286, "rcg", coalesce=rcg_coalesce,
+                                    batch="plot_batch")
+        self.pmt_hist = queuedClient("::1", 3287, "pmt_histogram")
+        self.swmr = rcg_config.swmr_tailing and not rcg_config.plot_bus
 
         # Make scan object for repeating the experiment
         N = int(self.p.StateReadout.repeat_each_measurement)
@@ -214,9 +217,15 @@ class PulseSequence(EnvExperiment):
         self.set_dataset("raw_run_data", np.full(N, np.nan))
 
         self.camera_string_states = []
+        self.threshold_calibrator = None
         if self.rm in ["pmt", "pmt_parity", "pmtMLE"]:
             self.use_camera = False
             self.n_ions = len(self.p.StateReadout.threshold_list)
+            if self.rm != "pmtMLE" and self.p.StateReadout.get("online_threshold_calibration", False):
+                self.threshold_calibrator = online_threshold_calibrator(
+                                                    self.n_ions,
+                                                    self.p.StateReadout.threshold_list
+                                                )
             for seq_name, dims in scan_specs.items():
                 if not self.is_ndim:
                 # Currently not supporting any default plotting for (n>1)-dim scans
@@ -289,6 +298,7 @@ class PulseSequence(EnvExperiment):
 
         # Setup for saving data
         self.filename = dict()
+        self.swmr_files = dict()
         self.dir = os.path.join(
                                 os.path.expanduser("~"), 
                                 "data",
@@ -352,6 +362,14 @@ class PulseSequence(EnvExperiment):
                     )
 
     def run(self):
+        try:
+            self.run_scans()
+        finally:
+            # analyze isn't called when run raises, don't leave data files
+            # open in SWMR mode
+            self.close_swmr()
+
+    def run_scans(self):
         if self.rm in ["camera", "camera_states", "camera_parity"]:
             self.initialize_camera()
         linetrigger = self.p.line_trigger_settings.enabled
@@ -502,6 +520,7 @@ class PulseSequence(EnvExperiment):
                                                     )
                                 self.reset_camera_settings()
                                 return
+                self.write_suggested_thresholds()
                 try:
                     self.run_after[seq_name]()
                 except FitError:
@@ -1083,6 +1102,8 @@ class PulseSequence(EnvExperiment):
             if seq_name not in self.range_guess.keys():
                 self.range_guess[seq_name] = x[0], x[-1]
             x = x[:i + 1]
+        if self.threshold_calibrator is not None:
+            self.update_threshold_calibration(data)
         for threshold in thresholds:
             idxs.append(bisect(data, threshold))
         idxs.append(self.N)
@@ -1119,6 +1140,29 @@ class PulseSequence(EnvExperiment):
                                         self.range_guess[seq_name]
                                     )
 
+    def update_threshold_calibration(self, data):
+        self.threshold_calibrator.update(data)
+        self.set_dataset("pmt_suggested_thresholds", 
+                         self.threshold_calibrator.thresholds(), broadcast=True)
+        self.set_dataset("pmt_threshold_fidelity", 
+                         self.threshold_calibrator.fidelity(), broadcast=True)
+
+    def write_suggested_thresholds(self):
+        # Called between scans, so the thresholds never change within a scan
+        if (self.threshold_calibrator is None or 
+                self.threshold_calibrator.background is None or
+                not self.p.StateReadout.get("auto_update_thresholds", False)):
+            return
+        thresholds = self.threshold_calibrator.thresholds()
+        try:
+            self.cxn.parametervault.set_parameter(
+                            ["StateReadout", "threshold_list", thresholds]
+                        )
+        except:
+            logger.error("Failed to write suggested thresholds.", exc_info=True)
+            return
+        self.p.StateReadout.threshold_list = thresholds
+
     def output_images_to_file(self, images, seq_name, i):
         image_region = [int(self.p.IonsOnCamera.horizontal_bin),
                         int(self.p.IonsOnCamera.vertical_bin),
@@ -1222,13 +1266,17 @@ class PulseSequence(EnvExperiment):
         if seq_name not in self.timestamp.keys():
             self.timestamp[seq_name] = None
         if self.timestamp[seq_name] is None:
+            self.close_swmr(seq_name)
             self.start_time = datetime.now()
             self.timestamp[seq_name] = self.start_time.strftime("%H%M_%S")
             self.filename[seq_name] = self.timestamp[seq_name] + ".h5"
-            with h5.File(self.filename[seq_name], "w") as f:
+            libver = "latest" if self.swmr else None
+            with h5.File(self.filename[seq_name], "w", libver=libver) as f:
                 datagrp = f.create_group("scan_data")
                 datagrp.attrs["plot_show"] = self.rcg_tabs[seq_name][self.selected_scan[seq_name]]
                 params = f.create_group("parameters")
+                if self.vault_version is not None:
+                    params.attrs["vault_session"], params.attrs["vault_version"] = self.vault_version
                 for collection in self.p.keys():
                     collectiongrp = params.create_group(collection)
                     for key, val in self.p[collection].items():
@@ -1241,30 +1289,75 @@ class PulseSequence(EnvExperiment):
                 csvwriter.writerow([self.timestamp[seq_name], cls_name,
                                     os.path.join(self.dir, self.filename[seq_name])])
             self.save_result(seq_name, is_multi, xdata=True)
+            if self.swmr:
+                self.start_swmr(seq_name, is_multi)
         delta = datetime.now() - self.start_time
         self.append_to_dataset("time", delta.total_seconds())
-        if self.rcg is None:
-            try:
-                self.rcg = Client("::1", 3286, "rcg")
-            except:
-                return
+        swmr = seq_name in self.swmr_files
+        if swmr:
+            self.write_swmr_point(seq_name, name, x, y)
         try:
             if self.master_scans:
                 title = self.timestamp[seq_name] + " - " + name + " ({})".format(seq_name)
             else:
                 title = self.timestamp[seq_name] + " - " + name
-            self.rcg.plot(
+            tab_name = self.rcg_tabs[seq_name][self.selected_scan[seq_name]]
+            file_ = os.path.join(os.getcwd(), self.filename[seq_name])
+            if swmr:
+                # The RCG reads the points from the data file
+                self.rcg.tail(
+                        file_, self.x_label[seq_name][0], seq_name + "-" + name, len(y),
+                        tab_name=tab_name,
+                        plot_title=title,
+                        range_guess=range_guess
+                    )
+            else:
+                self.rcg.plot(
                         x, y, 
-                        tab_name=self.rcg_tabs[seq_name][self.selected_scan[seq_name]],
+                        tab_name=tab_name,
                         plot_title=title, 
                         append=True,
-                        file_=os.path.join(os.getcwd(), 
-                        self.filename[seq_name]), 
+                        file_=file_, 
                         range_guess=range_guess
                     )
         except:
             return
 
+    def start_swmr(self, seq_name, is_multi):
+        # Datasets can't be created in SWMR mode, so create all of them
+        # before keeping the data file open in SWMR mode
+        for name in self.result_names(seq_name):
+            self.save_result(name, is_multi)
+        f = h5.File(self.filename[seq_name], "a", libver="latest")
+        f.swmr_mode = True
+        self.swmr_files[seq_name] = f
+
+    def write_swmr_point(self, seq_name, name, x, y):
+        n = len(y)
+        datagrp = self.swmr_files[seq_name]["scan_data"]
+        write_points(datagrp[self.x_label[seq_name][0]], x[-1:], n - 1)
+        write_points(datagrp[seq_name + "-" + name], y[-1:], n - 1)
+
+    def close_swmr(self, seq_name=None):
+        seq_names = list(self.swmr_files) if seq_name is None else [seq_name]
+        for seq_name in seq_names:
+            f = self.swmr_files.pop(seq_name, None)
+            if f is not None:
+                f.close()
+
+    def result_names(self, seq_name):
+        if not self.use_camera:
+            names = ["dark_ions:{}".format(k) for k in range(self.n_ions)]
+            if self.rm == "pmt_parity":
+                names.append("parity")
+        elif self.rm == "camera":
+            names = ["ion number:{}".format(k) for k in range(self.n_ions)]
+        else:
+            names = list(self.camera_string_states)
+            if self.rm == "camera_parity":
+                names.append("parity")
+        return [seq_name + "-" + name for name in names]
+
     def manual_save(self, x, y, name=None, plot_window="Current",
                     xlabel="x", ylabel="y"):
         # convenience function
@@ -1373,6 +1466,11 @@ class PulseSequence(EnvExperiment):
                 self.data[seq_name]["y"][k] = data
             except:
                 self.data[seq_name]["y"].append(data)  # This will fail for ndim scans
+        if seq_name in self.swmr_files:
+            # Datasets can't be deleted or created in SWMR mode
+            datagrp = self.swmr_files[seq_name]["scan_data"]
+            write_points(datagrp[dataset], data)
+            return
         with h5.File(self.filename[seq_name], "a") as f:
             datagrp = f["scan_data"]
             try:
@@ -1531,13 +1629,16 @@ class PulseSequence(EnvExperiment):
             logger.error("Final fit failed.", exc_info=True)
         except:
             pass
+        self.close_swmr()
         self.cxn.disconnect()
         self.global_cxn.disconnect()
-        try:
-            self.rcg.close_rpc()
-            self.pmt_hist.close_rpc()
-        except:
-            pass
+        for client in (self.rcg, self.pmt_hist):
+            try:
+                if hasattr(client, "stats"):
+                    logger.debug("Plot client to %s: %s", client.target, client.stats())
+                client.close_rpc()
+            except:
+                pass
 
     @classmethod
     def initialize_parameters(cls):
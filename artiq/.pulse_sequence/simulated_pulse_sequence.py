@@ -1,4 +1,5 @@
 from artiq.dashboard.drift_tracker import client_config as dt_config
+from artiq.dashboard.vault_mirror import load_parameters
 from artiq.language import core as core_language
 from sipyco.pc_rpc import Client
 from datetime import datetime
@@ -800,15 +801,13 @@ class PulseSequence:
     def load_parameter_vault(self):
         # Grab parametervault params:
         cxn = labrad.connect()
-        p = cxn.parametervault
-        collections = p.get_collections()
+        parameters, self.vault_version = load_parameters(cxn, dt_config.vault_mirror_socket)
         D = dict()
-        for collection in collections:
+        for collection, params in parameters.items():
             d = dict()
-            names = p.get_parameter_names(collection)
-            for name in names:
+            for name, param in params.items():
                 try:
-                    param = unitless(p.get_parameter([collection, name]))
+                    param = unitless(param)
                     d[name] = param
                     setattr(self, collection + "_" + name, param)
                 except:
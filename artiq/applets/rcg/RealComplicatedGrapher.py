@@ -7,13 +7,20 @@ import h5py
 import pickle
 import logging
 import os
+import time
 from datetime import datetime
 from itertools import cycle
 import pyperclip
 from artiq.applets.rcg.fitting.fit_menu import fitMenu
+from artiq.applets.rcg.fitting.batch_fit import batchFitWindow
 import artiq.applets.rcg.RealComplicatedGrapherConfig as conf
 from artiq.applets.rcg.tree_item import treeItem
 from artiq.applets.rcg.parameter_view import parameterView
+from artiq.applets.rcg.file_index import fileIndex
+from artiq.applets.rcg.curve_cache import curveCache
+from artiq.applets.rcg.plot_bus import subscribe
+from artiq.applets.rcg.swmr import swmrReader, open_data_file
+from artiq.applets.rcg.level_of_detail import frameTimer
 from artiq.gui.tools import QDockWidgetCloseDetect
 from sipyco.pc_rpc import Server
 from functools import partial
@@ -21,10 +28,40 @@ from functools import partial
 
 logger = logging.getLogger(__name__)
 pyqtgraph.setConfigOptions(**conf.opts)
+curve_cache = curveCache(conf.curve_cache_dir, conf.curve_cache_size)
+
+
+class startupTimer:
+    """Time spent in the phases of starting the RCG, logged once."""
+    def __init__(self):
+        # CPU time of the interpreter start-up and the imports so far
+        self.imports = time.process_time()
+        self.start = self.last = time.perf_counter()
+        self.phases = []
+        self.reported = False
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self, *details):
+        if self.reported:
+            return
+        self.reported = True
+        logger.info("RCG startup: imports %.2f s (cpu), %s, total %.2f s%s",
+                    self.imports,
+                    ", ".join("{} {:.2f} s".format(*phase) for phase in self.phases),
+                    self.last - self.start,
+                    "".join("; " + detail for detail in details))
+
+
+startup = startupTimer()
 
 
 class rcgDock(QDockWidgetCloseDetect):
     def __init__(self, main_window):
+        startup.mark("main window")
         QDockWidgetCloseDetect.__init__(self, "Real Complicated Grapher")
         self.setObjectName("RCG")
         self.main_window = main_window
@@ -37,6 +74,14 @@ class rcgDock(QDockWidgetCloseDetect):
         self.setTitleBarWidget(QtWidgets.QMainWindow())
         self.top_level_changed()
         self.connect_server()
+        startup.mark("server")
+        # Runs once the event loop has shown the window
+        QtCore.QTimer.singleShot(0, self.startup_done)
+
+    def startup_done(self):
+        startup.mark("first paint")
+        built = sum(self.rcg.widget(i).built for i in range(self.rcg.count()))
+        startup.report("{} of {} tabs built".format(built, self.rcg.count()))
 
     def top_level_changed(self):
         if self.isFloating():
@@ -48,12 +93,19 @@ class rcgDock(QDockWidgetCloseDetect):
 
     def connect_server(self):
         self.loop = asyncio.get_event_loop()
-        self.server = Server({"rcg": self.RemotePlotting(self.rcg)}, None, True)
+        self.plotting = self.RemotePlotting(self.rcg)
+        self.server = Server({"rcg": self.plotting}, None, True)
         self.task = self.loop.create_task(self.server.start(conf.host, conf.port))
+        self.bus_task = None
+        if conf.plot_bus:
+            self.bus_task = self.loop.create_task(subscribe(self.plotting.plot_batch))
 
     def closeEvent(self, event):
         self.is_closed = True
         self.task.cancel()
+        if self.bus_task is not None:
+            self.bus_task.cancel()
+        self.plotting.swmr_files.close()
         self.loop.create_task(self.server.stop())
         super(rcgDock, self).closeEvent(event)
 
@@ -61,6 +113,7 @@ class rcgDock(QDockWidgetCloseDetect):
     class RemotePlotting:
         def __init__(self, rcg):
             self.rcg = rcg
+            self.swmr_files = swmrReader()
 
         def echo(self, mssg):
             return mssg
@@ -70,6 +123,28 @@ class rcgDock(QDockWidgetCloseDetect):
 
         def plot(self, x, y, tab_name="Current", plot_name=None,
                  plot_title="new_plot", append=False, file_=None, range_guess=None):
+            self._plot(x, y, tab_name, plot_name, plot_title, append, file_, range_guess)
+
+        def plot_batch(self, curves):
+            """Plots a list of curves, each a dict of the keyword arguments of
+            plot, in a single pass with one repaint. Curves that fail to plot
+            are logged and skipped. Returns the number of curves plotted."""
+            plotted = 0
+            self.rcg.setUpdatesEnabled(False)
+            try:
+                for curve in curves:
+                    try:
+                        if self._plot(**curve) is not None:
+                            plotted += 1
+                    except Exception:
+                        logger.warning("Couldn't plot %s", curve.get("plot_title"),
+                                       exc_info=True)
+            finally:
+                self.rcg.setUpdatesEnabled(True)
+            return plotted
+
+        def _plot(self, x, y, tab_name="Current", plot_name=None,
+                  plot_title="new_plot", append=False, file_=None, range_guess=None):
             if plot_name is None:
                 # need to clean this up
                 for tab, graph_configs in conf.tab_configs:
@@ -79,32 +154,44 @@ class rcgDock(QDockWidgetCloseDetect):
                             tab_name = tab
                             break
             idx = self.rcg.tabs[tab_name]
+            gw = self.rcg.widget(idx).graph(plot_name)
             if type(x) is np.ndarray:
                 x = x[~np.isnan(x)]
             if type(y) is np.ndarray:
                 y = y[~np.isnan(y)]
-            if (plot_title in self.rcg.widget(idx).gw_dict[plot_name].items.keys() and
-                not append):
+            if plot_title in gw.items.keys() and not append:
                 i = 1
                 while True:
                     try_plot_title = plot_title + str(i)
-                    if try_plot_title not in self.rcg.widget(idx).gw_dict[plot_name].items.keys():
+                    if try_plot_title not in gw.items.keys():
                         plot_title = try_plot_title
                         break
                     else:
                         i += 1
             try:
-                self.rcg.widget(idx).gw_dict[plot_name].add_plot_item(plot_title,
-                                x, y, append=append, file_=file_, range_guess=range_guess)
+                return gw.add_plot_item(plot_title, x, y, append=append, file_=file_,
+                                        range_guess=range_guess)
             except AttributeError:
                 # curve not currently displayed on graph
                 return
 
+        def tail(self, file_, x, y, points, tab_name="Current", plot_name=None,
+                 plot_title="new_plot", range_guess=None):
+            """Plots the first points of the datasets x and y of a data file
+            being written in SWMR mode, like an appending plot call."""
+            try:
+                x_data = self.swmr_files.read(file_, x, points)
+                y_data = self.swmr_files.read(file_, y, points)
+            except Exception:
+                logger.warning("Couldn't read %s of %s", y, file_, exc_info=True)
+                return
+            self._plot(x_data, y_data, tab_name, plot_name, plot_title, True, file_, range_guess)
+
         def plot_from_file(self, file_, tab_name="Current", plot_name=None):
             if plot_name is None:
                 plot_name = tab_name
             idx = self.rcg.tabs[tab_name]
-            self.rcg.widget(idx).gw_dict[plot_name].upload_curve(file_=file_)
+            self.rcg.widget(idx).graph(plot_name).upload_curve(file_=file_)
 
 
 class RCG(PyQt5.QtWidgets.QTabWidget):
@@ -112,48 +199,93 @@ class RCG(PyQt5.QtWidgets.QTabWidget):
         PyQt5.QtWidgets.QTabWidget.__init__(self)
         self.setFocusPolicy(0)
         self.tabs = dict()
+        self.plot_tabs = dict()
         for name, graphconfigs in conf.tab_configs:
-            idx = self.addTab(graphTab(graphconfigs), name)
+            tab = graphTab(graphconfigs)
+            idx = self.addTab(tab, name)
             self.tabs[name] = idx
+            for gc in graphconfigs:
+                self.plot_tabs[gc.name] = tab
+        # Only the shown tab is built, the others when first shown or used
+        self.currentChanged.connect(self.build_tab)
+        self.build_tab(self.currentIndex())
+        startup.mark("tabs")
+        self.file_index = None
+        autoload, _ = conf.auto_load
+        if autoload:
+            self.start_file_index()
+        startup.mark("file index")
+
+    def build_tab(self, idx):
+        if idx >= 0:
+            self.widget(idx).build()
+
+    def start_file_index(self):
+        os.chdir(conf.data_dir)
+        dir_ = datetime.now().strftime("/%Y-%m-%d")
+        if not os.path.isdir(conf.data_dir + dir_):
+            return
+        self.file_index = fileIndex(conf.data_dir + dir_, conf.index_file)
+        self.file_index.entry_found.connect(self.add_indexed_entry)
+        self.file_index.start()
+
+    def add_indexed_entry(self, entry):
+        try:
+            tab = self.plot_tabs[entry["plot"]]
+        except KeyError:
+            return
+        tab.add_indexed_entry(entry)
 
 
 class graphTab(QtWidgets.QWidget):
+    """Tab of graph windows. The tab is an empty placeholder until it is
+    first shown or one of its graphs is used, when the graph windows are
+    built."""
     def __init__(self, graphconfigs):
         QtWidgets.QWidget.__init__(self)
-        layout = QtWidgets.QGridLayout()
+        self.graphconfigs = graphconfigs
+        self.built = False
+        # Indexed data files for graphs of the tab, added once it is built
+        self.pending = []
 
         self.gw_dict = {}
-        for gc in graphconfigs:
-            gw = graphWindow(gc.name, gc.show_points, gc.ylims)
-            layout.addWidget(gw, gc.row, gc.col, gc.rowspan, gc.colspan)
-            self.gw_dict[gc.name] = gw
+        layout = QtWidgets.QGridLayout()
         layout.setHorizontalSpacing(3)
         layout.setVerticalSpacing(3)
         layout.setContentsMargins(0, 0, 0, 0)
+        self.setLayout(layout)
+
+    def build(self):
+        if self.built:
+            return
+        self.built = True
+        start = time.perf_counter()
+        layout = self.layout()
+        for gc in self.graphconfigs:
+            gw = graphWindow(gc.name, gc.show_points, gc.ylims)
+            layout.addWidget(gw, gc.row, gc.col, gc.rowspan, gc.colspan)
+            self.gw_dict[gc.name] = gw
 
         for gw in self.gw_dict.values():
             s1 = gw.tw.sizeHint().width()
             s2 = gw.pg.sizeHint().width()
             gw.main_widget.setSizes([int(s1 * .4), int(s2 * 1.25)])
 
-        self.setLayout(layout)
+        for entry in self.pending:
+            self.add_indexed_entry(entry)
+        self.pending = []
+        logger.debug("Built graphs %s in %.3f s", ", ".join(self.gw_dict),
+                     time.perf_counter() - start)
 
-        autoload, autocheck = conf.auto_load
-        if autoload:
-            os.chdir(conf.data_dir)
-            dir_ = datetime.now().strftime("/%Y-%m-%d")
-            if not os.path.isdir(conf.data_dir + dir_):
-                return
-            for root, _, files in os.walk(conf.data_dir + dir_):
-                for file_ in sorted(files):
-                    if file_.endswith(".h5") or file_.endswith(".hdf5"):
-                        h5file = os.path.join(root, file_)
-                        try:
-                            with h5py.File(h5file, "r") as f:
-                                plot = f["scan_data"].attrs["plot_show"]
-                            self.gw_dict[plot].upload_curve(file_=h5file, checked=autocheck, startup=True)
-                        except:
-                            continue
+    def graph(self, name):
+        self.build()
+        return self.gw_dict[name]
+
+    def add_indexed_entry(self, entry):
+        if not self.built:
+            self.pending.append(entry)
+            return
+        self.gw_dict[entry["plot"]].add_indexed_curves(entry, checked=conf.auto_load[1])
 
 
 class graphWindow(QtWidgets.QWidget):
@@ -164,6 +296,12 @@ class graphWindow(QtWidgets.QWidget):
         self.name = name
         self.autoscroll_enabled = True
 
+        # Indexed curves that are checked but not loaded yet
+        self.pending = []
+        self.load_timer = QtCore.QTimer()
+        self.load_timer.setInterval(0)
+        self.load_timer.timeout.connect(self.load_pending)
+
         self.color_chooser = cycle(conf.default_colors)
         self.custom_colors = conf.custom_colors
         self.color_dialog = QtWidgets.QColorDialog()
@@ -211,6 +349,15 @@ class graphWindow(QtWidgets.QWidget):
             fit_menu.addAction(action)
         self.fit_menu = fit_menu
 
+        batch_fit_menu = QtWidgets.QMenu()
+        batch_fit_action = QtWidgets.QAction("Batch Fit", self.tw)
+        batch_fit_action.setMenu(batch_fit_menu)
+        self.tw.addAction(batch_fit_action)
+        for model in conf.fit_models:
+            action = QtWidgets.QAction(model, self.tw)
+            action.triggered.connect(partial(self.batch_fit, model))
+            batch_fit_menu.addAction(action)
+
         upload_curve_action = QtWidgets.QAction("Upload Curve", self.tw)
         upload_curve_action.setShortcut("Ctrl+O")
         upload_curve_action.setShortcutContext(QtCore.Qt.WidgetShortcut)
@@ -255,6 +402,10 @@ class graphWindow(QtWidgets.QWidget):
         toggle_autoscroll_action.triggered.connect(self.toggle_autoscroll)
         self.tw.addAction(toggle_autoscroll_action)
 
+        toggle_lod_action = QtWidgets.QAction("Toggle Level of Detail", self.tw)
+        toggle_lod_action.triggered.connect(self.toggle_lod)
+        self.tw.addAction(toggle_lod_action)
+
         load_params_action = QtWidgets.QAction("Load Parameters", self.tw)
         load_params_action.setShortcut("Ctrl+P")
         load_params_action.setShortcutContext(QtCore.Qt.WidgetShortcut)
@@ -270,6 +421,11 @@ class graphWindow(QtWidgets.QWidget):
         vb.addItem(self.img)
         self.pg.scene().sigMouseMoved.connect(self.mouse_moved)
         self.pg.scene().sigMouseClicked.connect(self.mouse_clicked)
+        self.lod_enabled = conf.lod
+        self.lod_updating = False
+        vb.sigXRangeChanged.connect(self.update_lod)
+        vb.sigResized.connect(self.update_lod)
+        self.frame_timer = frameTimer(self.pg)
 
         self.main_widget.addWidget(self.tw)
 
@@ -281,6 +437,10 @@ class graphWindow(QtWidgets.QWidget):
         self.coords.setAutoFillBackground(True)
         sublayout.addWidget(self.coords)
         sublayout.setContentsMargins(0, 0, 0, 2)
+        self.coords_text = ""
+        self.status_timer = QtCore.QTimer()
+        self.status_timer.timeout.connect(self.update_status)
+        self.status_timer.start(500)
         frame = QtWidgets.QFrame()
         frame.setLayout(sublayout)
         self.main_widget.addWidget(frame)
@@ -303,9 +463,18 @@ class graphWindow(QtWidgets.QWidget):
             return
         if "::FIT::  " in name:
             return
-        self.fitmenu = fitMenu(model, name, sI[0].plot_item, self)
+        self.fitmenu = fitMenu(model, name, sI[0], self)
         self.fitmenu.show()
 
+    def batch_fit(self, model):
+        # All curves of the graph, unless some are selected
+        items = self.tw.selectedItems() or list(self.items.values())
+        items = [item for item in items if "::FIT::  " not in item.name]
+        if not items:
+            return
+        self.batch_fit_window = batchFitWindow(model, items, self)
+        self.batch_fit_window.show()
+
     def upload_curve(self, *args, file_=None, checked=True, startup=False):
         if file_ is None:
             fdialog = QtWidgets.QFileDialog()
@@ -316,8 +485,10 @@ class graphWindow(QtWidgets.QWidget):
         else:
             fname = [file_]
         for fnamesie in fname:
+            # The layout and the data come from the curve cache, so the file
+            # is only opened if it changed since it was last read
             try:
-                f = h5py.File(fnamesie, "r")
+                layout = curve_cache.layout(fnamesie)
             except ValueError:
                 # User exited dialog without selecting file
                 continue
@@ -325,59 +496,88 @@ class graphWindow(QtWidgets.QWidget):
                 if not startup:
                     self.warning_message("Can't open {}".format(fnamesie))
                 continue
-            try:
-                data = f["scan_data"]
             except KeyError:
                 if not startup:
-                    self.warning_message("HDF5 file does not contain a 'scan_data' group.")
+                    self.warning_message("HDF5 file does not contain a 'scan_data' group "
+                                         "with a plot to embed in.")
                 continue
-            try:
-                plot_name = data.attrs["plot_show"]
-                if plot_name != self.name:
-                    if not startup:
-                        self.warning_message("Embeddding {} in {} window.".format(plot_name, self.name))
-                    # return
-            except KeyError:
+            plot_name = layout["plot"]
+            if plot_name != self.name:
                 if not startup:
-                    self.warning_message("Can't determine which plot to embed in.")
-                continue
-            ylist = []
-            for key in data.keys():
-                try:
-                    data[key].attrs["x-axis"]
-                    x = key
-                except KeyError:
-                    print("whoops")
-                    ylist.append(key)
-            try:
-                X = f["scan_data"][x].value
-            except:
+                    self.warning_message("Embeddding {} in {} window.".format(plot_name, self.name))
+            x = layout["x"]
+            if x is None:
                 if not startup:
                     self.warning_message("Can't determine which is x-axis.")
                 continue
-
-            Ylist = []
+            ylist = []
             txtlist = []
-            for y in ylist:
-                try:
-                    Y = f["scan_data"][y].value
-                    assert len(X) == len(Y)
-                    Ylist.append(Y)
-                    txt = fnamesie.split(".")[0].split("/")[-1]  + " - " + y
-                    if txt in self.items.keys():
-                        f.close()
-                        return
-                    txtlist.append(txt)
-                except AssertionError:
+            for y in layout["y"]:
+                if layout["shapes"][y] != layout["shapes"][x]:
                     continue
-            if len(Ylist) == 0:
+                txt = fnamesie.split(".")[0].split("/")[-1]  + " - " + y
+                if txt in self.items.keys():
+                    return
+                ylist.append(y)
+                txtlist.append(txt)
+            if len(ylist) == 0:
+                continue
+            try:
+                X = curve_cache.read(fnamesie, x)
+                Ylist = [curve_cache.read(fnamesie, y) for y in ylist]
+            except (OSError, KeyError):
+                if not startup:
+                    self.warning_message("Can't read {}".format(fnamesie))
                 continue
             for i in range(len(Ylist)):
                 item = self.add_plot_item(txtlist[i], X, Ylist[i], file_=fnamesie)
                 self.pg.setXRange(X[0], X[-1])
                 if not checked:
                     item.setCheckState(0, 0)
-            f.close()
+
+    def add_indexed_curves(self, entry, checked=True):
+        """Adds the curves of an indexed data file to the tree without
+        reading their data, which is loaded once they are checked."""
+        path, x = entry["path"], entry["x"]
+        if x is None:
+            return
+        for y in entry["y"]:
+            if entry["shapes"][y] != entry["shapes"][x]:
+                continue
+            txt = path.split(".")[0].split("/")[-1] + " - " + y
+            if txt in self.items.keys():
+                continue
+            loader = partial(self.read_curve, path, x, y)
+            item = treeItem(self, txt, [], [], self.pg, next(self.color_chooser),
+                            self.show_points, file_=path, loader=loader)
+            self.items[txt] = item
+            self.tw.addTopLevelItem(item)
+            if checked:
+                self.pending.append(item)
+            else:
+                item.setCheckState(0, 0)
+        if self.pending:
+            self.load_timer.start()
+
+    def read_curve(self, path, x, y):
+        return curve_cache.read(path, x), curve_cache.read(path, y)
+
+    def load_pending(self):
+        # Curves visible in the tree are loaded first, one file read per
+        # event loop iteration to keep the GUI responsive
+        self.pending = [item for item in self.pending
+                        if item.loader is not None and item.checkState(0)]
+        if not self.pending:
+            self.load_timer.stop()
+            return
+        viewport = self.tw.viewport().rect()
+        for item in self.pending:
+            if self.tw.visualItemRect(item).intersects(viewport):
+                break
+        else:
+            item = self.pending[0]
+        self.pending.remove(item)
+        item.plot()
 
     def remove_curve(self, *args, curve=None):
         root = self.tw.invisibleRootItem()
@@ -419,12 +619,42 @@ class graphWindow(QtWidgets.QWidget):
     def toggle_autoscroll(self):
         self.autoscroll_enabled = not self.autoscroll_enabled
 
+    def toggle_lod(self):
+        self.lod_enabled = not self.lod_enabled
+        self.update_lod()
+
+    def displayed_data(self, item):
+        """Returns the points of item to draw and whether to show
+        symbols, clipped and decimated to the view if LOD is enabled."""
+        if not self.lod_enabled:
+            return item.x, item.y, item.show_points
+        (xmin, xmax), _ = self.pg.viewRange()
+        pixels = self.pg.plotItem.vb.width()
+        x, y = item.lod.view(item.curve, xmin, xmax, pixels)
+        show_points = item.show_points and len(x) <= conf.lod_symbol_density * pixels
+        return x, y, show_points
+
+    def update_lod(self, *args):
+        # Redrawing can change the auto range, don't recurse
+        if self.lod_updating:
+            return
+        self.lod_updating = True
+        try:
+            for item in self.items.values():
+                if item.plot_item is not None:
+                    item.redraw()
+        finally:
+            self.lod_updating = False
+
+    def update_status(self):
+        self.coords.setText(self.coords_text + "    " + self.frame_timer.text())
+
     def load_params(self):
         if len(self.tw.selectedItems()) != 1:
             return
         item = self.tw.selectedItems()[0]
         try:
-            f = h5py.File(item.file, "r")
+            f = open_data_file(item.file)
         except:
             self.warning_message("Couldn't open data file.")
             return
@@ -448,11 +678,10 @@ class graphWindow(QtWidgets.QWidget):
     def snap_to_view(self):
         globalymin, globalymax, globalxmin, globalxmax = None, None, None, None
         for item in self.items.values():
-            try:
-                ymin, ymax = item.plot_item.dataBounds(1)
-                xmin, xmax = item.plot_item.dataBounds(0)
-            except AttributeError:
+            if item.plot_item is None or item.curve.xbounds is None:
                 continue
+            xmin, xmax = item.curve.xbounds
+            ymin, ymax = item.curve.ybounds
             if globalymin is None:
                 globalymin = ymin
             elif globalymin > ymin:
@@ -482,7 +711,7 @@ class graphWindow(QtWidgets.QWidget):
             show_points = self.show_points
         if append and name in self.items.keys():
             item = self.items[name]
-            item.plot_item.setData(sorted(x), [i for _, i in sorted(zip(x, y))])
+            item.update_data(x, y)
         else:
             color = next(self.color_chooser)
             try:
@@ -500,13 +729,17 @@ class graphWindow(QtWidgets.QWidget):
         try:
             max_x, min_y, max_y = None, None, None
 
-            max_x = max(list(x))#self.items[name].plot_item.databounds(0)[-1]
+            if item.curve.xbounds is None:
+                return item
+            max_x = item.curve.xbounds[1]
 
             # Can optionally auto adjust range in response to all currently plotted items,
             # by uncommenting below
-            for item in self.items.values():
-            #     localxmax = item.plot_item.dataBounds(0)[-1]
-                localymin, localymax = item.plot_item.dataBounds(1)
+            for plotted in self.items.values():
+            #     localxmax = plotted.curve.xbounds[1]
+                if plotted.plot_item is None or plotted.curve.ybounds is None:
+                    continue
+                localymin, localymax = plotted.curve.ybounds
             #     if max_x is None:
             #         max_x = localxmax
             #     elif localxmax > max_x:
@@ -537,7 +770,7 @@ class graphWindow(QtWidgets.QWidget):
         except UnboundLocalError:
             # Autoscroll option is toggled simultaneously
             pass
-        except AttributeError:
+        except (AttributeError, TypeError):
             # curve is not currently displayed on graph
             pass
         return item
@@ -555,7 +788,8 @@ class graphWindow(QtWidgets.QWidget):
         else:
             pnt_y = "{:.4f}".format(ypnt)
         str_ = "    ({} , {})".format(pnt_x, pnt_y)
-        self.coords.setText(str_)
+        self.coords_text = str_
+        self.update_status()
         self.pos = pos
 
     def mouse_clicked(self, ev):
@@ -574,9 +808,11 @@ def main():
     from quamash import QEventLoop, QtWidgets, QtCore
     from artiq import __artiq_dir__ as artiq_dir
     from concurrent.futures._base import CancelledError
+    logging.basicConfig(level=logging.INFO)
     app = QtWidgets.QApplication(["Real Complicated Grapher"])
     loop = QEventLoop(app)
     asyncio.set_event_loop(loop)
+    startup.mark("qt")
 
     class mainWindow(QtWidgets.QMainWindow):
         def __init__(self):
@@ -9,6 +9,35 @@ host = "::1"
 port = 3286
 
 
+# Plot bus (python -m artiq.applets.rcg.plot_bus). With plot_bus True,
+# experiments publish plot updates to the bus instead of calling the RCG, and
+# every RCG subscribes to it. Subscribers that stop reading for bus_timeout
+# seconds are dropped, and the bus keeps the latest update of bus_max_curves
+# curves for new subscribers.
+plot_bus = False
+bus_host = "::1"
+bus_publish_port = 3290
+bus_subscribe_port = 3291
+bus_timeout = 10
+bus_max_curves = 1000
+bus_max_message = 2**28
+
+
+# Experiments send plot updates from a queue of at most client_max_queue
+# calls, with client_timeout seconds for every call to the RCG.
+client_max_queue = 1000
+client_timeout = 10
+
+
+# With swmr_tailing, experiments write their data files in HDF5 SWMR mode and
+# only notify the RCG of new points, which it reads from the file, so the RCG
+# must run on the machine that takes the data. Data files written this way
+# need HDF5 1.10 or later to be read. Not used with the plot bus. At most
+# swmr_max_files files being written are kept open by the RCG.
+swmr_tailing = False
+swmr_max_files = 8
+
+
 # Data directory location
 data_dir = os.path.join(os.path.expanduser("~"), "data")
 
@@ -19,6 +48,38 @@ data_dir = os.path.join(os.path.expanduser("~"), "data")
 auto_load = True, True
 
 
+# Persistent index of the data files found by auto_load, so that only new or
+# modified files are opened when the RCG is restarted.
+index_file = os.path.join(data_dir, ".rcg_index.json")
+
+
+# Cache of decoded curves, as memory-mapped NumPy files, so that curves shown
+# before are not decoded from HDF5 again. Least recently used entries are
+# removed when it grows beyond curve_cache_size bytes.
+curve_cache_dir = os.path.join(data_dir, ".rcg_cache")
+curve_cache_size = 2**30
+
+
+# Level of detail rendering: clip curves to the visible x range and draw
+# min/max decimated curves when there are more points than pixels. Symbols are
+# hidden when there are more visible points per pixel than lod_symbol_density.
+lod = True
+lod_symbol_density = 0.2
+
+
+# Fits run on fit_workers worker processes (None for one per CPU) and are
+# aborted after fit_timeout seconds.
+fit_workers = 2
+fit_timeout = 30
+
+
+# With Auto Fit, curves are refitted at most every auto_fit_interval seconds as
+# points arrive. A fit has converged when the errors of all varied parameters
+# are below auto_fit_target percent of their values.
+auto_fit_interval = 0.5
+auto_fit_target = 1.0
+
+
 # Options to pass to pyqtgraph.setConfigOptions()
 opts = {"foreground": "w"}
 
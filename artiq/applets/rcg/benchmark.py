@@ -0,0 +1,84 @@
+"""
+Plotting throughput of a running RCG, one curve per plot call against
+plot_batch.
+
+    python -m artiq.applets.rcg.benchmark -c 1 4 16 64 -u 50
+
+Every case appends updates scan points to a number of curves, the way a
+PulseSequence with one curve per ion or per camera state does, and reports
+the curves plotted per second. The curves are plotted in the given tab with
+titles starting with "benchmark".
+"""
+import argparse
+import json
+import time
+import numpy as np
+from sipyco.pc_rpc import Client
+import artiq.applets.rcg.RealComplicatedGrapherConfig as conf
+
+
+def single(rcg, curves, tab_name):
+    for curve in curves:
+        rcg.plot(tab_name=tab_name, **curve)
+
+
+def batch(rcg, curves, tab_name):
+    rcg.plot_batch([dict(curve, tab_name=tab_name) for curve in curves])
+
+
+modes = {"single": single, "batch": batch}
+
+
+def run_case(rcg, mode, n_curves, updates, tab_name):
+    x = np.linspace(0, 1, updates)
+    ys = np.random.random((n_curves, updates))
+    run = "benchmark {} {} {}".format(mode, n_curves, time.strftime("%H%M%S"))
+    start = time.perf_counter()
+    for i in range(updates):
+        curves = [dict(x=x[:i + 1], y=y[:i + 1], plot_title="{} - {}".format(run, k),
+                       append=True, range_guess=(0, 1))
+                  for k, y in enumerate(ys)]
+        modes[mode](rcg, curves, tab_name)
+    elapsed = time.perf_counter() - start
+    return n_curves * updates / elapsed
+
+
+def get_argparser():
+    parser = argparse.ArgumentParser(description="RCG plotting throughput benchmark")
+    parser.add_argument("-s", "--server", default=conf.host,
+                        help="hostname or IP of the RCG (default: %(default)s)")
+    parser.add_argument("-p", "--port", type=int, default=conf.port,
+                        help="TCP port of the RCG (default: %(default)s)")
+    parser.add_argument("-t", "--tab", default="Current",
+                        help="tab to plot in (default: %(default)s)")
+    parser.add_argument("-c", "--curves", type=int, nargs="+", default=[1, 4, 16, 64],
+                        help="numbers of curves per update (default: %(default)s)")
+    parser.add_argument("-u", "--updates", type=int, default=50,
+                        help="scan points per curve (default: %(default)s)")
+    parser.add_argument("-o", "--output", default=None,
+                        help="write the results as JSON to this file")
+    return parser
+
+
+def main():
+    args = get_argparser().parse_args()
+    rcg = Client(args.server, args.port, "rcg")
+    results = []
+    try:
+        for n_curves in args.curves:
+            rates = dict()
+            for mode in modes:
+                rates[mode] = run_case(rcg, mode, n_curves, args.updates, args.tab)
+            print("{:4d} curves: single {:10.1f} curves/s, batch {:10.1f} curves/s, "
+                  "{:6.2f}x".format(n_curves, rates["single"], rates["batch"],
+                                    rates["batch"] / rates["single"]))
+            results.append(dict(curves=n_curves, updates=args.updates, **rates))
+    finally:
+        rcg.close_rpc()
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import numpy as np
+
+
+class curveBuffer:
+    """Preallocated, growable storage of the points of one curve.
+
+    Points are kept sorted by x once the curve is appended to, and the
+    data bounds are updated with every new point, so appending k points
+    costs O(k) unless they arrive out of order. version is incremented
+    whenever the points change.
+    """
+    def __init__(self, x=(), y=(), capacity=256):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        self._x = np.empty(max(capacity, 2 * len(x)))
+        self._y = np.empty(len(self._x))
+        self.n = 0
+        self.version = 0
+        self.reset(x, y, sort=False)
+
+    @property
+    def x(self):
+        return self._x[:self.n]
+
+    @property
+    def y(self):
+        return self._y[:self.n]
+
+    def __len__(self):
+        return self.n
+
+    def reset(self, x, y, sort=True):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        self.n = 0
+        self.reserve(len(x))
+        if sort:
+            order = np.argsort(x, kind="stable")
+            self._x[:len(x)] = x[order]
+            self._y[:len(x)] = y[order]
+        else:
+            self._x[:len(x)] = x
+            self._y[:len(x)] = y
+        self.n = len(x)
+        self.version += 1
+        self.is_sorted = sort or bool(np.all(np.diff(x) >= 0))
+        # Points in the order they were received, to recognize resent data
+        self.received = len(x)
+        self.first = (x[0], y[0]) if len(x) else None
+        self.last = (x[-1], y[-1]) if len(x) else None
+        self.xbounds = self.ybounds = None
+        self._update_bounds(x, y)
+
+    def update(self, x, y):
+        """Takes the full curve as resent with every new point and appends
+        the points that were not received yet. The curve is recognized as
+        resent by its length and by the first and last points received,
+        otherwise it replaces the points."""
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        k = self.received
+        if (len(x) >= k > 0 and self._same_point(x[0], y[0], self.first) and
+                self._same_point(x[k - 1], y[k - 1], self.last)):
+            self.extend(x[k:], y[k:])
+        else:
+            self.reset(x, y)
+
+    @staticmethod
+    def _same_point(x, y, point):
+        # nan points, as of unfinished scans, are equal to themselves
+        return all(a == b or (a != a and b != b) for a, b in zip((x, y), point))
+
+    def extend(self, x, y):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        k = len(x)
+        if k == 0:
+            return
+        if not self.is_sorted:
+            self.reset(self.x.copy(), self.y.copy())
+        self.reserve(self.n + k)
+        n = self.n
+        if (n == 0 or x[0] >= self._x[n - 1]) and np.all(np.diff(x) >= 0):
+            self._x[n:n + k] = x
+            self._y[n:n + k] = y
+        else:
+            order = np.argsort(x, kind="stable")
+            new_x, new_y = x[order], y[order]
+            positions = np.searchsorted(self._x[:n], new_x, side="right")
+            new_index = positions + np.arange(k)
+            old_index = np.arange(n) + np.searchsorted(positions, np.arange(n), side="right")
+            merged_x = np.empty(len(self._x))
+            merged_y = np.empty(len(self._y))
+            merged_x[old_index] = self._x[:n]
+            merged_y[old_index] = self._y[:n]
+            merged_x[new_index] = new_x
+            merged_y[new_index] = new_y
+            self._x, self._y = merged_x, merged_y
+        self.n = n + k
+        self.version += 1
+        if not self.received:
+            self.first = (x[0], y[0])
+        self.received += k
+        self.last = (x[-1], y[-1])
+        self._update_bounds(x, y)
+
+    def reserve(self, size):
+        if size <= len(self._x):
+            return
+        capacity = max(size, 2 * len(self._x))
+        for attr in ("_x", "_y"):
+            new = np.empty(capacity)
+            new[:self.n] = getattr(self, attr)[:self.n]
+            setattr(self, attr, new)
+
+    def _update_bounds(self, x, y):
+        for attr, values in (("xbounds", x), ("ybounds", y)):
+            values = values[np.isfinite(values)]
+            if not len(values):
+                continue
+            lo, hi = values.min(), values.max()
+            bounds = getattr(self, attr)
+            if bounds is not None:
+                lo, hi = min(lo, bounds[0]), max(hi, bounds[1])
+            setattr(self, attr, (lo, hi))
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import logging
+import os
+import numpy as np
+from artiq.applets.rcg.swmr import open_data_file
+from artiq.applets.rcg.file_index import read_entry
+
+
+logger = logging.getLogger(__name__)
+
+
+class curveCache:
+    """Decoded datasets of data files, stored as NumPy files and memory
+    mapped when read again, so that restarting the RCG doesn't decode the
+    HDF5 files of the day again.
+
+    Entries are keyed by file path, modification time and dataset name, so
+    a modified file misses the cache. The layout of the files, as read by
+    read_entry, is cached the same way, so that files are only opened on a
+    miss. When the cache grows beyond max_bytes, the least recently used
+    entries are removed, which also clears entries of modified or deleted
+    files.
+    """
+    # Rows copied from a dataset to its entry at a time on a miss
+    chunk = 2**16
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = None
+
+    def entry(self, path, mtime, dataset, suffix=".npy"):
+        key = "{}\0{}\0{}".format(os.path.abspath(path), mtime, dataset)
+        return os.path.join(self.directory,
+                            hashlib.sha1(key.encode()).hexdigest() + suffix)
+
+    def layout(self, path):
+        """Returns the read_entry of the data file at path."""
+        mtime = os.stat(path).st_mtime_ns
+        entry = self.entry(path, mtime, "", ".json")
+        try:
+            with open(entry, "r") as f:
+                layout = json.load(f)
+            os.utime(entry)
+            return layout
+        except (OSError, ValueError):
+            pass
+        layout = read_entry(path, mtime)
+        tmp = entry + ".tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp, "w") as f:
+                json.dump(layout, f)
+            os.replace(tmp, entry)
+        except OSError:
+            logger.warning("Couldn't write RCG curve cache entry.", exc_info=True)
+            return layout
+        self.add(entry)
+        return layout
+
+    def read(self, path, dataset, group=None):
+        """Returns the dataset of the scan_data group of the data file at
+        path. group is the open scan_data group of the file, if any, to read
+        from on a cache miss."""
+        mtime = os.stat(path).st_mtime_ns
+        entry = self.entry(path, mtime, dataset)
+        try:
+            data = np.load(entry, mmap_mode="r")
+            # Evicting goes by modification time, so touch the entry on use
+            os.utime(entry)
+            return data
+        except (OSError, ValueError):
+            pass
+        if group is None:
+            with open_data_file(path) as f:
+                return self.copy(entry, f["scan_data"][dataset])
+        return self.copy(entry, group[dataset])
+
+    def copy(self, entry, dataset):
+        """Copies the HDF5 dataset to the entry a chunk at a time and
+        returns the entry memory mapped, without holding all of the data in
+        memory at once."""
+        if dataset.ndim != 1 or not len(dataset) or dataset.dtype.hasobject:
+            data = dataset[()]
+            self.write(entry, data)
+            return data
+        tmp = entry + ".tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            out = np.lib.format.open_memmap(tmp, "w+", dataset.dtype, dataset.shape)
+            for start in range(0, len(dataset), self.chunk):
+                out[start:start + self.chunk] = dataset[start:start + self.chunk]
+            out.flush()
+            del out
+            os.replace(tmp, entry)
+            data = np.load(entry, mmap_mode="r")
+        except OSError:
+            logger.warning("Couldn't write RCG curve cache entry.", exc_info=True)
+            return dataset[()]
+        self.add(entry)
+        return data
+
+    def write(self, entry, data):
+        data = np.asarray(data)
+        if data.dtype.hasobject:
+            return
+        tmp = entry + ".tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp, "wb") as f:
+                np.save(f, data)
+            os.replace(tmp, entry)
+        except OSError:
+            logger.warning("Couldn't write RCG curve cache entry.", exc_info=True)
+            return
+        self.add(entry)
+
+    def add(self, entry):
+        if self.size is None:
+            self.size = sum(size for _, size, _ in self.entries())
+        else:
+            self.size += os.path.getsize(entry)
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def entries(self):
+        for name in os.listdir(self.directory):
+            if not name.endswith((".npy", ".json")):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            yield stat.st_mtime, stat.st_size, path
+
+    def evict(self):
+        """Removes the least recently used entries until the cache is at
+        most half full, so that evicting doesn't happen on every write."""
+        for _, size, path in sorted(self.entries()):
+            if self.size <= self.max_bytes / 2:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.size -= size
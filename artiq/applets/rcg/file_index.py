@@ -0,0 +1,83 @@
+import json
+import logging
+import os
+import threading
+from PyQt5 import QtCore
+from artiq.applets.rcg.swmr import open_data_file
+
+
+logger = logging.getLogger(__name__)
+
+
+def read_entry(path, mtime):
+    """Reads what the RCG needs to know about a data file without
+    loading any of its data."""
+    with open_data_file(path) as f:
+        data = f["scan_data"]
+        entry = {"path": path,
+                 "mtime": mtime,
+                 "sequence": os.path.basename(os.path.dirname(path)),
+                 "plot": str(data.attrs["plot_show"]),
+                 "x": None,
+                 "y": [],
+                 "shapes": dict()}
+        for key in data.keys():
+            if "x-axis" in data[key].attrs:
+                entry["x"] = key
+            else:
+                entry["y"].append(key)
+            entry["shapes"][key] = list(data[key].shape)
+    return entry
+
+
+class fileIndex(QtCore.QObject):
+    """Scans a data directory in a background thread and emits an entry
+    for every RCG data file found. Entries are kept in a persistent
+    index, so only new or modified files are opened on later starts."""
+    entry_found = QtCore.pyqtSignal(dict)
+    finished = QtCore.pyqtSignal()
+
+    def __init__(self, directory, index_file):
+        QtCore.QObject.__init__(self)
+        self.directory = directory
+        self.index_file = index_file
+        self.thread = None
+        try:
+            with open(index_file, "r") as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = dict()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.scan, daemon=True)
+        self.thread.start()
+
+    def scan(self):
+        index = dict()
+        for root, _, files in os.walk(self.directory):
+            for file_ in sorted(files):
+                if not (file_.endswith(".h5") or file_.endswith(".hdf5")):
+                    continue
+                path = os.path.join(root, file_)
+                try:
+                    mtime = os.path.getmtime(path)
+                    entry = self.index.get(path)
+                    if entry is None or entry["mtime"] != mtime:
+                        entry = read_entry(path, mtime)
+                except Exception:
+                    # Not an RCG data file, or still being written
+                    continue
+                index[path] = entry
+                self.entry_found.emit(entry)
+        self.index = index
+        self.save()
+        self.finished.emit()
+
+    def save(self):
+        tmp = self.index_file + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self.index, f)
+            os.replace(tmp, self.index_file)
+        except OSError:
+            logger.warning("Couldn't write RCG file index.", exc_info=True)
@@ -0,0 +1,156 @@
+import csv
+import h5py
+import numpy as np
+from PyQt5 import QtWidgets, QtCore
+from artiq.applets.rcg.fitting.fit_engine import get_engine
+
+
+class numericItem(QtWidgets.QTableWidgetItem):
+    """Table cell that sorts by its number rather than its text."""
+    def __init__(self, value, text=None):
+        QtWidgets.QTableWidgetItem.__init__(self, text or "{:.6g}".format(value))
+        self.value = value
+        self.setTextAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+
+    def __lt__(self, other):
+        try:
+            return self.value < other.value
+        except AttributeError:
+            return QtWidgets.QTableWidgetItem.__lt__(self, other)
+
+
+class batchFitWindow(QtWidgets.QWidget):
+    """Fits one fit function to many curves in parallel on the fit engine
+    and shows the fitted parameters with their errors in a sortable table."""
+    def __init__(self, name, items, graph):
+        QtWidgets.QWidget.__init__(self)
+        self.name = name
+        self.graph = graph
+        self.setWindowTitle("Batch Fit: {} ({} curves)".format(name, len(items)))
+        self.engine = get_engine()
+        self.engine.finished.connect(self.on_fit_finished)
+        self.engine.failed.connect(self.on_fit_failed)
+        self.params = None
+        self.results = dict()
+
+        self.table = QtWidgets.QTableWidget(len(items), 2)
+        self.table.setHorizontalHeaderLabels(["Curve", "Status"])
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.table.setAlternatingRowColors(True)
+        self.rows = dict()
+        for row, item in enumerate(items):
+            key = "batch/{}/{}/{}".format(graph.name, name, item.name)
+            self.rows[key] = QtWidgets.QTableWidgetItem(item.name)
+            self.table.setItem(row, 0, self.rows[key])
+            self.table.setItem(row, 1, QtWidgets.QTableWidgetItem("queued"))
+
+        csv_button = QtWidgets.QPushButton("Export CSV")
+        csv_button.released.connect(self.export_csv)
+        hdf5_button = QtWidgets.QPushButton("Export HDF5")
+        hdf5_button.released.connect(self.export_hdf5)
+        cancel_button = QtWidgets.QPushButton("Cancel")
+        cancel_button.released.connect(self.cancel)
+        sublayout = QtWidgets.QHBoxLayout()
+        sublayout.addWidget(cancel_button)
+        sublayout.addWidget(csv_button)
+        sublayout.addWidget(hdf5_button)
+        layout = QtWidgets.QVBoxLayout()
+        layout.addWidget(self.table)
+        layout.addLayout(sublayout)
+        self.setLayout(layout)
+        self.resize(800, 400)
+
+        for key, item in zip(self.rows, items):
+            item.load()
+            x, y = item.getData()
+            self.engine.submit(key, name, x, y, None)
+
+    def set_columns(self, names):
+        self.params = names
+        labels = ["Curve", "Status"]
+        for name in names:
+            labels += [name, "± " + name]
+        labels.append("Reduced chi-square")
+        self.table.setColumnCount(len(labels))
+        self.table.setHorizontalHeaderLabels(labels)
+
+    def set_status(self, key, status):
+        # Sorting moves rows, so look up the row of the curve every time
+        row = self.table.row(self.rows[key])
+        self.table.setItem(row, 1, QtWidgets.QTableWidgetItem(status))
+
+    def on_fit_finished(self, key, result):
+        if key not in self.rows:
+            return
+        if self.params is None:
+            self.set_columns(result["names"])
+        self.results[key] = result
+        self.table.setSortingEnabled(False)
+        row = self.table.row(self.rows[key])
+        self.set_status(key, "ok" if result["success"] else result["message"])
+        for i, (value, error) in enumerate(zip(result["values"], result["errors"])):
+            self.table.setItem(row, 2 + 2 * i, numericItem(value))
+            self.table.setItem(row, 3 + 2 * i, numericItem(error))
+        self.table.setItem(row, 2 + 2 * len(self.params), numericItem(result["redchi"]))
+        self.table.setSortingEnabled(True)
+
+    def on_fit_failed(self, key, message):
+        if key not in self.rows:
+            return
+        self.set_status(key, message)
+
+    def cancel(self):
+        for key in self.rows:
+            if key not in self.results and self.engine.running(key):
+                self.engine.cancel(key)
+                self.set_status(key, "cancelled")
+
+    def rows_in_table_order(self):
+        keys = {id(item): key for key, item in self.rows.items()}
+        for row in range(self.table.rowCount()):
+            key = keys[id(self.table.item(row, 0))]
+            if key in self.results:
+                yield self.rows[key].text(), self.results[key]
+
+    def export_csv(self):
+        if self.params is None:
+            return
+        fname = QtWidgets.QFileDialog.getSaveFileName(self, "Export CSV", "",
+                                                      "CSV Files (*.csv)")[0]
+        if not fname:
+            return
+        with open(fname, "w", newline="") as f:
+            writer = csv.writer(f)
+            header = ["curve"]
+            for name in self.params:
+                header += [name, name + "_error"]
+            writer.writerow(header + ["redchi", "points"])
+            for curve, result in self.rows_in_table_order():
+                row = [curve]
+                for value, error in zip(result["values"], result["errors"]):
+                    row += [value, error]
+                writer.writerow(row + [result["redchi"], result["points"]])
+
+    def export_hdf5(self):
+        if self.params is None:
+            return
+        fname = QtWidgets.QFileDialog.getSaveFileName(self, "Export HDF5", "",
+                                                      "HDF5 Files (*.h5 *.hdf5)")[0]
+        if not fname:
+            return
+        curves, results = zip(*self.rows_in_table_order())
+        with h5py.File(fname, "w") as f:
+            f.attrs["fit_function"] = self.name
+            f.create_dataset("curve", data=np.array(curves, dtype=h5py.string_dtype()))
+            values = np.array([result["values"] for result in results])
+            errors = np.array([result["errors"] for result in results])
+            for i, name in enumerate(self.params):
+                f.create_dataset(name, data=values[:, i])
+                f.create_dataset(name + "_error", data=errors[:, i])
+            f.create_dataset("redchi", data=[result["redchi"] for result in results])
+            f.create_dataset("points", data=[result["points"] for result in results])
+
+    def closeEvent(self, event):
+        self.cancel()
+        self.engine.finished.disconnect(self.on_fit_finished)
+        self.engine.failed.disconnect(self.on_fit_failed)
@@ -0,0 +1,87 @@
+"""
+Fit iterations and time per fit function, with and without the analytic
+jacobians, on synthetic data.
+
+    python -m artiq.applets.rcg.fitting.benchmark -o results.json
+
+Every fit function is fitted to noisy data generated from it, sampled
+uniformly and at random points, starting from its guess_parameters. A fit
+converged if its reduced chi-square is within 50 % of the noise variance.
+"""
+import argparse
+import importlib
+import json
+import time
+import numpy as np
+from artiq.applets.rcg.fitting import fit_functions
+from artiq.applets.rcg.fitting.fit_engine import fit_curve
+
+
+# True parameters and x range of the synthetic data of every fit function
+cases = {
+    "sine": ((0.5, 3, 0.3, 0.1), (0, 1e-3)),
+    "sinesquared": ((0.8, 5, 0.2, 0.1), (0, 50e-6)),
+    "linear": ((2., 1.), (0, 1)),
+    "gaussian": ((0.8, 0.5, 0.1), (0, 1)),
+    "lorentzian": ((0.1, 0.5, 0.1), (0, 1)),
+    "exponential_decay": ((1., 1., 0.1), (0, 5)),
+    "exponential_decaied_sinesquare": ((0.9, 30, 5, 0.2, 0.05), (0, 60e-6)),
+    "gaussian_sinesquare": ((0.9, 30, 5, 0.2, 0.05), (0, 60e-6)),
+    "gaussian_sinequad": ((0.9, 0, 30, 5, 0.2, 0.05), (0, 60e-6)),
+}
+
+
+def sample(sampling, points, xrange_, rng):
+    if sampling == "uniform":
+        return np.linspace(*xrange_, points)
+    return np.sort(rng.uniform(*xrange_, points))
+
+
+def run(points=100, noise=0.02, repeats=3, seed=0):
+    rng = np.random.default_rng(seed)
+    results = []
+    for name in fit_functions.__all__:
+        module = importlib.import_module(fit_functions.__name__ + "." + name)
+        truth, xrange_ = cases[name]
+        for sampling in ("uniform", "random"):
+            x = sample(sampling, points, xrange_, rng)
+            y = module.fit_function(x, *truth) + rng.normal(0, noise, points)
+            for use_jacobian in (False, True):
+                best = np.inf
+                for i in range(repeats):
+                    start = time.perf_counter()
+                    result = fit_curve(module, x, y, use_jacobian=use_jacobian)
+                    best = min(best, time.perf_counter() - start)
+                converged = bool(result.redchi < 1.5 * noise**2)
+                results.append(dict(function=name, sampling=sampling,
+                                    jacobian=use_jacobian, nfev=int(result.nfev),
+                                    seconds=best, converged=converged))
+                print("{:32s} {:8s} {:9s} {:6d} evaluations {:9.3f} ms  {}".format(
+                      name, sampling, "jacobian" if use_jacobian else "numeric",
+                      result.nfev, best * 1e3, "converged" if converged else "FAILED"))
+    return results
+
+
+def get_argparser():
+    parser = argparse.ArgumentParser(description="RCG fit function benchmarks")
+    parser.add_argument("-o", "--output", default=None,
+                        help="write the results as JSON to this file")
+    parser.add_argument("-n", "--points", type=int, default=100,
+                        help="points per curve (default: %(default)s)")
+    parser.add_argument("--noise", type=float, default=0.02,
+                        help="standard deviation of the noise (default: %(default)s)")
+    parser.add_argument("-r", "--repeats", type=int, default=3,
+                        help="number of timing repeats per fit (default: %(default)s)")
+    return parser
+
+
+def main():
+    args = get_argparser().parse_args()
+    results = run(args.points, args.noise, args.repeats)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
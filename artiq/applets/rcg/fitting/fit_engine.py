@@ -0,0 +1,232 @@
+import importlib
+import inspect
+import itertools
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+from lmfit import Model
+from PyQt5 import QtCore
+from artiq.applets.rcg.fitting import fit_functions
+import artiq.applets.rcg.RealComplicatedGrapherConfig as conf
+
+
+# Seconds between progress reports, and cancellation checks, of a running fit
+progress_interval = 0.2
+
+
+def find_fit_function(name):
+    for f in fit_functions.__all__:
+        module = importlib.import_module(fit_functions.__name__ + "." + f)
+        if getattr(module, "name", None) == name:
+            return module
+    raise ValueError("Unknown fit function: {}".format(name))
+
+
+def arguments(module):
+    return inspect.getfullargspec(module.fit_function).args[1:]
+
+
+def guess_parameters(module, x, y):
+    """Initial parameters of the fit function in module, from its
+    guess_parameters if it has one and its defaults otherwise."""
+    args = arguments(module)
+    p0 = module.fit_function.__defaults__ or [0] * len(args)
+    if hasattr(module, "guess_parameters"):
+        p0 = module.guess_parameters(x, y)
+    return {arg: val if val is not None else 0 for arg, val in zip(args, p0)}
+
+
+def jacobian_function(module):
+    """Derivatives of the lmfit residual, data - model, with respect to the
+    varied parameters, from the analytic jacobian of the fit function in
+    module, or None if it has none."""
+    if not hasattr(module, "jacobian"):
+        return None
+    args = arguments(module)
+
+    def dfun(params, data, weights, x=None, **kwargs):
+        jac = -np.asarray(module.jacobian(x, *[params[arg].value for arg in args]))
+        jac = jac[[i for i, arg in enumerate(args) if params[arg].vary]]
+        if weights is not None:
+            jac = jac * weights
+        return jac
+    return dfun
+
+
+def fit_curve(module, x, y, p0=None, vary=None, iter_cb=None, use_jacobian=True):
+    """Fits y(x) with the fit function in module and returns the lmfit
+    result. Uses the analytic jacobian of the fit function, if it has one,
+    unless use_jacobian is False."""
+    if p0 is None:
+        p0 = guess_parameters(module, x, y)
+    model = Model(module.fit_function)
+    params = model.make_params(**p0)
+    for arg, flag in (vary or {}).items():
+        params[arg].vary = flag
+    fit_kws = dict()
+    dfun = jacobian_function(module) if use_jacobian else None
+    if dfun is not None:
+        fit_kws = {"Dfun": dfun, "col_deriv": True}
+    return model.fit(y, params, x=x, iter_cb=iter_cb, fit_kws=fit_kws)
+
+
+def fit(key, job, name, x, y, p0, vary, timeout, progress, cancelled):
+    """Fits y(x) with the fit function called name, starting from the
+    parameters p0, or guessed ones if p0 is None. Runs in a worker process
+    of fitEngine."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if np.isnan(y).any():
+        end = np.isnan(y).argmax()
+        x, y = x[:end], y[:end]
+    module = find_fit_function(name)
+    start = time.monotonic()
+    state = {"report": start, "aborted": None}
+
+    def iter_cb(params, iteration, resid, *args, **kwargs):
+        now = time.monotonic()
+        if timeout is not None and now - start > timeout:
+            state["aborted"] = "timeout"
+            return True
+        if now - state["report"] > progress_interval:
+            state["report"] = now
+            if job in cancelled:
+                state["aborted"] = "cancelled"
+                return True
+            progress.put((key, job, iteration, float(np.sum(resid**2))))
+        return False
+
+    result = fit_curve(module, x, y, p0, vary, iter_cb)
+    if state["aborted"] is not None:
+        return {"aborted": state["aborted"], "seconds": time.monotonic() - start}
+    names = list(result.params.keys())
+    return {"names": names,
+            "values": [float(result.params[p].value) for p in names],
+            "errors": [float(result.params[p].stderr)
+                       if result.params[p].stderr is not None else np.nan
+                       for p in names],
+            "chisqr": float(result.chisqr),
+            "redchi": float(result.redchi),
+            "nfev": int(result.nfev),
+            "points": len(x),
+            "success": bool(result.success),
+            "message": str(result.message),
+            "aborted": state["aborted"],
+            "seconds": time.monotonic() - start}
+
+
+class fitEngine(QtCore.QObject):
+    """Runs fits on a pool of worker processes so that the GUI never blocks.
+
+    Every fit is submitted for a key, normally the curve it fits. A newer
+    fit for the same key supersedes the previous one, which is dropped if
+    still queued and aborted if running, and only results of the latest
+    fit of a key are delivered, through the finished and failed signals.
+    """
+    progress = QtCore.pyqtSignal(str, int, float)
+    finished = QtCore.pyqtSignal(str, dict)
+    failed = QtCore.pyqtSignal(str, str)
+    _progress = QtCore.pyqtSignal(str, int, int, float)
+    _done = QtCore.pyqtSignal(str, int, object)
+
+    def __init__(self, workers=None, timeout=None):
+        QtCore.QObject.__init__(self)
+        self.timeout = timeout
+        # Don't fork the GUI
+        context = multiprocessing.get_context("spawn")
+        self.manager = context.Manager()
+        self.progress_queue = self.manager.Queue()
+        self.cancelled = self.manager.dict()
+        self.executor = ProcessPoolExecutor(workers, mp_context=context)
+        self.jobs = dict()
+        self.counter = itertools.count()
+        self._progress.connect(self.on_progress)
+        self._done.connect(self.on_done)
+        self.thread = threading.Thread(target=self.read_progress, daemon=True)
+        self.thread.start()
+
+    def submit(self, key, name, x, y, p0, vary=None, timeout=None):
+        """Queues a fit of y(x) with the fit function called name, starting
+        from the parameter values in the dict p0, or guessed ones if p0 is
+        None. Parameters mapped to False in vary are fixed. Returns the job
+        number of the fit."""
+        self.cancel(key)
+        job = next(self.counter)
+        if timeout is None:
+            timeout = self.timeout
+        future = self.executor.submit(fit, key, job, name,
+                                      np.asarray(x, dtype=float),
+                                      np.asarray(y, dtype=float),
+                                      None if p0 is None else dict(p0),
+                                      dict(vary or {}), timeout,
+                                      self.progress_queue, self.cancelled)
+        self.jobs[key] = job, future
+        future.add_done_callback(partial(self._done.emit, key, job))
+        return job
+
+    def cancel(self, key):
+        try:
+            job, future = self.jobs.pop(key)
+        except KeyError:
+            return
+        if not future.cancel():
+            self.cancelled[job] = True
+
+    def running(self, key):
+        return key in self.jobs
+
+    def is_current(self, key, job):
+        return self.jobs.get(key, (None,))[0] == job
+
+    def read_progress(self):
+        while True:
+            try:
+                message = self.progress_queue.get()
+            except (EOFError, OSError):
+                return
+            if message is None:
+                return
+            self._progress.emit(*message)
+
+    def on_progress(self, key, job, nfev, chisqr):
+        if self.is_current(key, job):
+            self.progress.emit(key, nfev, chisqr)
+
+    def on_done(self, key, job, future):
+        self.cancelled.pop(job, None)
+        if not self.is_current(key, job):
+            return
+        del self.jobs[key]
+        if future.cancelled():
+            return
+        exception = future.exception()
+        if exception is not None:
+            self.failed.emit(key, str(exception))
+            return
+        result = future.result()
+        if result["aborted"] == "timeout":
+            self.failed.emit(key, "Fit timed out after {:.3g} s".format(result["seconds"]))
+            return
+        self.finished.emit(key, result)
+
+    def close(self):
+        for key in list(self.jobs):
+            self.cancel(key)
+        self.executor.shutdown(wait=False)
+        self.progress_queue.put(None)
+        self.thread.join(1)
+        self.manager.shutdown()
+
+
+_engine = None
+
+
+def get_engine():
+    """Returns the fit engine shared by all graph windows."""
+    global _engine
+    if _engine is None:
+        _engine = fitEngine(conf.fit_workers, conf.fit_timeout)
+    return _engine
@@ -6,3 +6,20 @@ Tex = r"(A - B)\cdot exp[-t/T] + B"
 
 def fit_function(x, A=1, T=1, B=1):
     return (A-B) * np.exp(-x/T) + B
+
+def jacobian(x, A=1, T=1, B=1):
+    e = np.exp(-x/T)
+    return np.array([e, (A-B) * e * x / T**2, 1 - e])
+
+def guess_parameters(xdata, ydata):
+    x = np.asarray(xdata, dtype=float)
+    y = np.asarray(ydata, dtype=float)
+    order = np.argsort(x)
+    x, y = x[order], y[order]
+    n = max(len(x) // 10, 1)
+    A = np.mean(y[:n])
+    B = np.mean(y[-n:])
+    # The area between the curve and B is (A - B) T for a full decay
+    area = np.sum((y[1:] + y[:-1] - 2 * B) * np.diff(x)) / 2
+    T = area / (A - B) if A != B else np.ptp(x)
+    return A, abs(T) or np.ptp(x), B
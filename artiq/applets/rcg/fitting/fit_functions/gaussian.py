@@ -1,4 +1,6 @@
 import numpy as np
+from math import erf, sqrt, pi, log
+from artiq.applets.rcg.fitting.guess import peak_moments
 
 name = "gaussian"
 
@@ -7,9 +9,13 @@ Tex = r"A\cdot exp[-(x-x_0)^2/2\sigma^2]"
 def fit_function(x, A=.5, x0=0, sigma=1):
     return A * np.exp(-(x - x0)**2 / (2 * sigma**2))
 
-def guess_parameters(xdata, ydata):
-    A = np.max(ydata)
-    x0 = xdata[np.argmax(ydata)]
-    std = np.std(ydata)
-    sigma = np.abs(xdata[np.argmin(ydata - std)] - x0)
-    return A, x0, sigma
+def jacobian(x, A=.5, x0=0, sigma=1):
+    g = np.exp(-(x - x0)**2 / (2 * sigma**2))
+    return np.array([g, A * g * (x - x0) / sigma**2, A * g * (x - x0)**2 / sigma**3])
+
+def guess_parameters(xdata, ydata, level=0.25):
+    baseline, height, x0, std = peak_moments(xdata, ydata, level)
+    # Variance of a gaussian truncated where it falls to level of its peak
+    a = sqrt(-2 * log(level))
+    truncated = 1 - 2 * a * np.exp(-a**2 / 2) / sqrt(2 * pi) / erf(a / sqrt(2))
+    return baseline + height, x0, std / sqrt(truncated)
@@ -1,4 +1,5 @@
 import numpy as np
+from artiq.applets.rcg.fitting.guess import dominant_frequency
 
 name = "gaussian_sinequad"
 
@@ -7,14 +8,26 @@ Tex = r"0.25 A [1 + exp[- (x-x0) / \tau \cdot 10^{-6})^2/2] [-2 cos[2 (2\pi / 4T
 def fit_function(x, A=1, x0=0, tau=1, tpi=1, phi=0, B=0):
     return 0.5 * A * (1 - (2 * np.exp(-((x-x0)**2)/2/(tau*1e-6)**2) * np.cos(2*2 * np.pi * (1/(4*tpi)) * 1e6 * (x-x0) + phi)- np.exp(-((x-x0)**2)/(tau*1e-6)**2) * np.cos(2*2 * np.pi * (1/(4*tpi)) * 1e6 * (x-x0) + phi)**2)) + B
 
+def jacobian(x, A=1, x0=0, tau=1, tpi=1, phi=0, B=0):
+    u = x - x0
+    e = np.exp(-(u**2)/2/(tau*1e-6)**2)
+    theta = 2*2 * np.pi * (1/(4*tpi)) * 1e6 * u + phi
+    c, s = np.cos(theta), np.sin(theta)
+    # The model is 0.5 A (1 - 2p + p^2) + B with p = e c
+    p = e * c
+    dp = -A * (1 - p)
+    k = np.pi * 1e6 / tpi
+    return np.array([0.5 * (1 - p)**2,
+                     dp * (c * e * u / (tau*1e-6)**2 + e * s * k),
+                     dp * c * e * u**2 / (tau*1e-6)**3 * 1e-6,
+                     dp * e * s * k * u / tpi,
+                     -dp * e * s,
+                     np.ones_like(x)])
+
 def guess_parameters(xdata, ydata):
     B = 0#np.min(ydata)
     A = 0.5#np.max(ydata) - B
-    x = np.array(xdata)
     x0 = 0.
-    y = np.array(ydata)
-    f = np.fft.fftfreq(len(x), (x[1] - x[0]))  # This assumes uniform spacing
-    F = abs(np.fft.fft(y))
-    freq = abs(f[np.argmax(F[1:]) + 1])
+    freq = dominant_frequency(xdata, ydata)
     tau = np.max(xdata) * 0.5 * 1e6
     return A, x0, tau, 1 / (2.0 * freq * 1e-6), 0., B
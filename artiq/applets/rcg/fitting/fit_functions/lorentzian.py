@@ -1,4 +1,6 @@
 import numpy as np
+from math import atan, sqrt
+from artiq.applets.rcg.fitting.guess import peak_moments
 
 name = "lorentzian"
 
@@ -7,9 +9,15 @@ Tex = r"\frac{A}{(x-x_0)^2 + \gamma^2/4}"
 def fit_function(x, A=1, x0=0, gamma=1):
     return A * (gamma / 2) / ((x - x0)**2 + (gamma/2)**2)
 
-def guess_parameters(xdata, ydata):
-    A = np.max(ydata)
-    x0 = xdata[np.argmax(ydata)]
-    std = np.std(ydata)
-    gamma = np.abs(xdata[np.argmin(ydata - std)] - x0)
-    return A, x0, gamma
+def jacobian(x, A=1, x0=0, gamma=1):
+    u = x - x0
+    h = gamma / 2
+    d = u**2 + h**2
+    return np.array([h / d, A * h * 2 * u / d**2, 0.5 * A * (u**2 - h**2) / d**2])
+
+def guess_parameters(xdata, ydata, level=0.25):
+    baseline, height, x0, std = peak_moments(xdata, ydata, level)
+    # Variance of a lorentzian truncated where it falls to level of its peak
+    k = sqrt(1 / level - 1)
+    half_width = std / sqrt((k - atan(k)) / atan(k))
+    return (baseline + height) * half_width, x0, 2 * half_width
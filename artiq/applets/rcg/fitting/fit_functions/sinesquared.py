@@ -1,4 +1,5 @@
 import numpy as np
+from artiq.applets.rcg.fitting.guess import dominant_frequency
 
 name = "sinesquared"
 
@@ -7,13 +8,14 @@ Tex = r"A sin^2[(2\pi / 4T_{\pi}) \cdot x + \phi] + B"
 def fit_function(x, A=1, tpi=1, phi=0, B=0):
     return A * np.sin(2 * np.pi * (1/(4*tpi)) * 1e6 * x + phi)**2 + B
 
+def jacobian(x, A=1, tpi=1, phi=0, B=0):
+    theta = 2 * np.pi * (1/(4*tpi)) * 1e6 * x + phi
+    s2 = np.sin(2 * theta)
+    return np.array([np.sin(theta)**2, -A * s2 * 2 * np.pi * (1/(4*tpi**2)) * 1e6 * x,
+                     A * s2, np.ones_like(x)])
+
 def guess_parameters(xdata, ydata):
     B = np.min(ydata)
     A = np.max(ydata) - B
-    x = np.array(xdata)
-    y = np.array(ydata)
-    f = np.fft.fftfreq(len(x), (x[1] - x[0]))  # This assumes uniform spacing
-    F = abs(np.fft.fft(y))
-    freq = abs(f[np.argmax(F[1:]) + 1])
+    freq = dominant_frequency(xdata, ydata)
     return A, 1 / (2.0 * freq * 1e-6), 0., B
-
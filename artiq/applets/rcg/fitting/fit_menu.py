@@ -8,7 +8,9 @@ from artiq.applets.rcg.fitting.fit_functions import *
 from artiq.applets.rcg.fitting.fit_functions import __all__ as fit_functions
 from functools import partial
 from artiq.applets.rcg.tree_item import treeItem
-from lmfit import Model
+from artiq.applets.rcg.level_of_detail import adaptive_grid
+from artiq.applets.rcg.fitting.fit_engine import get_engine
+import artiq.applets.rcg.RealComplicatedGrapherConfig as conf
 from collections import OrderedDict as dict
 
 
@@ -27,6 +29,7 @@ class fitMenu(QtWidgets.QWidget):
             except AttributeError:
                 continue
             if ffname == name:
+                self.name = name
                 self.fit_function = fit_function.fit_function
                 self.Tex = fit_function.Tex
                 argspec = inspect.getfullargspec(self.model)
@@ -47,6 +50,11 @@ class fitMenu(QtWidgets.QWidget):
         self.p0 = []
         self.title = "::FIT::  {}".format(title)
         self.setWindowTitle(self.title)
+        self.key = "{}/{}".format(self.graph.name, self.title)
+        self.engine = get_engine()
+        self.engine.progress.connect(self.on_fit_progress)
+        self.engine.finished.connect(self.on_fit_finished)
+        self.engine.failed.connect(self.on_fit_failed)
 
         layout = QtWidgets.QVBoxLayout()
         self.tw = QtWidgets.QTreeWidget()
@@ -101,14 +109,46 @@ class fitMenu(QtWidgets.QWidget):
         save_plot_button = QtWidgets.QPushButton("Save")
         save_plot_button.released.connect(self.on_save_plot_button_released)
         save_plot_button.setCheckable(False)
+        self.cancel_button = QtWidgets.QPushButton("Cancel")
+        self.cancel_button.released.connect(self.on_cancel_button_released)
+        self.cancel_button.setCheckable(False)
+        self.cancel_button.setEnabled(False)
         sublayout = QtWidgets.QHBoxLayout()
         sublayout.addWidget(manual_button)
         sublayout.addWidget(fit_button)
+        sublayout.addWidget(self.cancel_button)
         sublayout.addWidget(save_plot_button)
+        self.auto_fit = QtWidgets.QCheckBox("Auto Fit")
+        self.auto_fit.stateChanged.connect(self.on_auto_fit_changed)
+        self.target = QtWidgets.QDoubleSpinBox()
+        self.target.setPrefix("target error ")
+        self.target.setSuffix(" %")
+        self.target.setDecimals(2)
+        self.target.setRange(0, 100)
+        self.target.setValue(conf.auto_fit_target)
+        autolayout = QtWidgets.QHBoxLayout()
+        autolayout.addWidget(self.auto_fit)
+        autolayout.addWidget(self.target)
+        self.status = QtWidgets.QLabel("")
+        self.auto_timer = QtCore.QTimer()
+        self.auto_timer.setInterval(int(conf.auto_fit_interval * 1e3))
+        self.auto_timer.timeout.connect(self.auto_refit)
+        self.submitted_version = None
+        self.errors = None
+        # Manual previews are redrawn at most once per display frame
+        screen = QtGui.QGuiApplication.primaryScreen()
+        refresh_rate = screen.refreshRate() if screen is not None else 0
+        self.preview_timer = QtCore.QTimer()
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(int(1000 / (refresh_rate or 60)))
+        self.preview_timer.timeout.connect(self.update_preview)
+        self.graph.pg.plotItem.vb.sigXRangeChanged.connect(self.on_view_changed)
 
         layout.addWidget(model_label)
         layout.addWidget(self.tw)
         layout.addLayout(sublayout)
+        layout.addLayout(autolayout)
+        layout.addWidget(self.status)
         self.setLayout(layout)
         self.setMinimumWidth(500)
 
@@ -126,58 +166,136 @@ class fitMenu(QtWidgets.QWidget):
         self.plot_active = True
         self.p0 = [self.tw.itemWidget(self.tw.topLevelItem(i), 2).value()
                                     for i in range(self.tw.topLevelItemCount())]
+        if not self.preview_timer.isActive():
+            self.preview_timer.start()
 
+    def on_view_changed(self, *args):
+        if self.plot_active and not self.preview_timer.isActive():
+            self.preview_timer.start()
+
+    def update_preview(self):
         x = self.data_item.getData()[0]
-        delta = 0#np.abs(x[-1] - x[0])
-        xrange_ = np.linspace(x[0] - delta, x[-1] + delta, 10000)
+        if not len(x):
+            return
+        vb = self.graph.pg.plotItem.vb
+        (xmin, xmax), (ymin, ymax) = vb.viewRange()
+        # The visible part of the data, or all of it if none is visible
+        lo, hi = max(xmin, np.min(x)), min(xmax, np.max(x))
+        if lo >= hi:
+            lo, hi = np.min(x), np.max(x)
         try:
-            y = self.fit_function(xrange_, *self.p0)
+            xrange_, y = adaptive_grid(lambda x: self.fit_function(x, *self.p0), lo, hi,
+                                       points=max(int(vb.width()) // 4, 50),
+                                       tolerance=(ymax - ymin) / max(vb.height(), 1))
         except:
             return
 
-        if self.plot_item is not None:
-            self.graph.remove_curve(curve=self.plot_item)
-            del self.plot_item
-
-        self.plot_item = treeItem(self.graph, self.title, xrange_, y, self.graph.pg, self.color, False)
-        self.graph.items[self.title] = self.plot_item
-        self.graph.tw.addTopLevelItem(self.plot_item)
+        if self.plot_item is None or self.graph.items.get(self.title) is not self.plot_item:
+            self.plot_item = treeItem(self.graph, self.title, xrange_, y, self.graph.pg, self.color, False)
+            self.graph.items[self.title] = self.plot_item
+            self.graph.tw.addTopLevelItem(self.plot_item)
+        else:
+            self.plot_item.curve.reset(xrange_, y, sort=False)
+            if self.plot_item.plot_item is not None:
+                self.plot_item.redraw()
         self.fit_curve_drawn = True
 
     def on_fit_button_released(self):
         p0 = dict()
-        truth_list = []
-        self.fit_function.__defaults__ = ()
+        vary = dict()
         for i in range(len(self.args)):
             top_widget = self.tw.topLevelItem(i)
             p0[self.args[i]] = self.tw.itemWidget(top_widget, 2).value()
-            truth_list.append(bool(self.tw.itemWidget(top_widget, 0).checkState()))
-        fitmodel = Model(self.fit_function)
-        params = fitmodel.make_params(**p0)
-        for i, flag in enumerate(truth_list):
-            if not flag:
-                params[self.args[i]].vary = False
-        try:
-            x, y = self.data_item.getData()
-            if np.isnan(y).any():
-                end = np.isnan(y).argmax()
-                y = y[:end]
-                x = x[:end]
-            result = fitmodel.fit(y, params, x=x)
-        except Exception as e:
-            print(e)
-        self.plot_active = True
+            vary[self.args[i]] = bool(self.tw.itemWidget(top_widget, 0).checkState())
+        x, y = self.data_item.getData()
+        self.submitted_version = self.data_item.curve.version
+        self.engine.submit(self.key, self.name, x, y, p0, vary)
+        self.cancel_button.setEnabled(True)
+        self.status.setText("Fitting...")
+
+    def on_auto_fit_changed(self, state):
+        if state:
+            self.auto_timer.start()
+            self.auto_refit()
+        else:
+            self.auto_timer.stop()
+
+    def auto_refit(self):
+        """Refits, starting from the last fitted values, when points were
+        added since the last fit and no fit is running, so that refits never
+        queue up behind incoming data."""
+        if self.engine.running(self.key):
+            return
+        if self.data_item.curve.version == self.submitted_version:
+            return
+        self.on_fit_button_released()
+
+    def converged(self):
+        """True when the errors of all varied parameters are below the
+        target relative error."""
+        target = self.target.value() / 100
+        for i, (value, error) in enumerate(zip(self.params, self.errors)):
+            if not self.tw.itemWidget(self.tw.topLevelItem(i), 0).checkState():
+                continue
+            if not np.isfinite(error) or abs(error) > target * abs(value):
+                return False
+        return True
+
+    def on_cancel_button_released(self):
+        self.engine.cancel(self.key)
+        self.cancel_button.setEnabled(False)
+        self.status.setText("Fit cancelled")
+
+    def on_fit_progress(self, key, nfev, chisqr):
+        if key != self.key:
+            return
+        self.status.setText("Fitting... {} evaluations, chi-square {:.4g}".format(nfev, chisqr))
+
+    def on_fit_failed(self, key, message):
+        if key != self.key:
+            return
+        self.cancel_button.setEnabled(False)
+        self.status.setText(message)
+
+    def on_fit_finished(self, key, result):
+        if key != self.key:
+            return
+        self.cancel_button.setEnabled(False)
         self.params = []
-        for i, (_, value) in enumerate(result.params.valuesdict().items()):
-            self.tw.topLevelItem(i).setText(3, str(value))
+        self.errors = []
+        # Redraw the fit curve once rather than for every parameter
+        self.plot_active = False
+        for i, (value, error) in enumerate(zip(result["values"], result["errors"])):
             top_widget = self.tw.topLevelItem(i)
-            self.tw.itemWidget(top_widget, 2).setValue(float(value))
-            self.fit_function.__defaults__ = self.defaults
+            if np.isfinite(error):
+                top_widget.setText(3, "{:.6g} \u00b1 {:.2g}".format(value, error))
+            else:
+                top_widget.setText(3, str(value))
+            guess = self.tw.itemWidget(top_widget, 2)
+            guess.setValue(float(value))
+            guess.setSingleStep(max(value / 100, .001))
             self.params.append(value)
+            self.errors.append(error)
+        self.on_manual_button_released()
+        status = "{} points, {} evaluations in {:.2f} s, reduced chi-square {:.4g}".format(
+                 result["points"], result["nfev"], result["seconds"], result["redchi"])
+        if self.converged():
+            status += ", converged to target error"
+            self.status.setStyleSheet("QLabel { color: green }")
+        else:
+            self.status.setStyleSheet("")
+        self.status.setText(status)
         self.fit_curve_drawn = True
 
     def closeEvent(self, event):
-        if self.fit_curve_drawn:
+        self.auto_timer.stop()
+        self.preview_timer.stop()
+        self.graph.pg.plotItem.vb.sigXRangeChanged.disconnect(self.on_view_changed)
+        self.engine.cancel(self.key)
+        self.engine.progress.disconnect(self.on_fit_progress)
+        self.engine.finished.disconnect(self.on_fit_finished)
+        self.engine.failed.disconnect(self.on_fit_failed)
+        if self.fit_curve_drawn and self.graph.items.get(self.title) is self.plot_item:
             self.graph.remove_curve(curve=self.plot_item)
 
     def mathTex_to_QPixmap(self, mathTex, fs):
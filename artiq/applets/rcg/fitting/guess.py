@@ -0,0 +1,66 @@
+import numpy as np
+
+
+def dominant_frequency(x, y, oversampling=5, max_points=2**22):
+    """Frequency, in 1/units of x, of the strongest oscillation in y(x).
+
+    Uses the Lomb-Scargle periodogram, which unlike the FFT doesn't need
+    uniformly spaced x. The frequency grid goes up to the Nyquist
+    frequency of the median spacing and is evaluated in chunks of at most
+    max_points frequency-point pairs.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    span = np.ptp(x) if len(x) else 0
+    if len(x) < 3 or span == 0:
+        return 1 / span if span else 1.
+    y = y - y.mean()
+    step = np.median(np.diff(np.sort(x)))
+    if step <= 0:
+        step = span / (len(x) - 1)
+    df = 1 / (oversampling * span)
+    freqs = np.arange(df, 0.5 / step + df, df)
+    power = np.empty(len(freqs))
+    chunk = max(max_points // len(x), 1)
+    for i in range(0, len(freqs), chunk):
+        w = 2 * np.pi * freqs[i:i + chunk, None]
+        tau = np.arctan2(np.sin(2 * w * x).sum(axis=1),
+                         np.cos(2 * w * x).sum(axis=1))[:, None] / (2 * w)
+        c = np.cos(w * (x - tau))
+        s = np.sin(w * (x - tau))
+        power[i:i + chunk] = ((c @ y)**2 / (c * c).sum(axis=1) +
+                              (s @ y)**2 / (s * s).sum(axis=1))
+    return freqs[np.argmax(power)]
+
+
+def peak_moments(x, y, level=0.25):
+    """Baseline, height, center and standard deviation of the peak of y(x).
+
+    The baseline is the minimum of y. Center and standard deviation are the
+    moments of the part of the peak that is above level times its height,
+    computed with trapezoidal weights, so x needn't be uniformly spaced. The
+    standard deviation is that of the truncated peak; the callers correct it
+    for their line shape.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    order = np.argsort(x)
+    x, y = x[order], y[order]
+    baseline = y.min()
+    w = y - baseline
+    peak = np.argmax(w)
+    height = w[peak]
+    below = np.flatnonzero(w < level * height)
+    left = below[below < peak]
+    right = below[below > peak]
+    lo = left[-1] + 1 if len(left) else 0
+    hi = right[0] if len(right) else len(x)
+    xs, ws = x[lo:hi], w[lo:hi]
+    if len(xs) < 3:
+        # Unresolved peak, so its width is about the point spacing
+        return baseline, height, x[peak], np.ptp(x) / max(len(x) - 1, 1)
+    ws = ws * np.gradient(xs)
+    norm = ws.sum()
+    center = (xs * ws).sum() / norm
+    std = np.sqrt(((xs - center)**2 * ws).sum() / norm)
+    return baseline, height, center, std
@@ -0,0 +1,108 @@
+import time
+import numpy as np
+
+
+def peak_decimate(x, y, factor):
+    """Reduces every bin of factor consecutive points to its minimum and
+    maximum, placed at the first and last x of the bin, so that peaks
+    survive the decimation. Trailing points that don't fill a bin are
+    kept as they are."""
+    bins = len(x) // factor
+    m = bins * factor
+    ybins = y[:m].reshape(bins, factor)
+    xbins = x[:m].reshape(bins, factor)
+    xd = np.empty(2 * bins)
+    yd = np.empty(2 * bins)
+    xd[0::2] = xbins[:, 0]
+    xd[1::2] = xbins[:, -1]
+    yd[0::2] = ybins.min(axis=1)
+    yd[1::2] = ybins.max(axis=1)
+    return np.concatenate((xd, x[m:])), np.concatenate((yd, y[m:]))
+
+
+class lodCache:
+    """Decimated versions of one curve, computed once per zoom level
+    (a power of two of points per bin) and reused until the curve
+    changes."""
+    def __init__(self):
+        self.version = None
+        self.levels = dict()
+
+    def view(self, curve, xmin, xmax, pixels):
+        """Returns the points of curve to draw for the x range
+        [xmin, xmax] spanning the given number of pixels."""
+        x, y = curve.x, curve.y
+        n = len(x)
+        if curve.is_sorted and n:
+            # Keep one point on either side so lines leave the view
+            start = max(np.searchsorted(x, xmin, side="left") - 1, 0)
+            stop = min(np.searchsorted(x, xmax, side="right") + 1, n)
+        else:
+            start, stop = 0, n
+        factor = 1
+        while (stop - start) / factor > 2 * max(pixels, 1):
+            factor *= 2
+        if factor == 1:
+            return x[start:stop], y[start:stop]
+        if curve.version != self.version:
+            self.levels = dict()
+            self.version = curve.version
+        if factor not in self.levels:
+            self.levels[factor] = peak_decimate(x, y, factor)
+        xd, yd = self.levels[factor]
+        m = (n // factor) * factor
+
+        def index(i, bin_index):
+            # Position of point i in the decimated curve, where the
+            # undecimated tail follows the 2 points of every bin
+            if i > m:
+                return 2 * (m // factor) + i - m
+            return 2 * bin_index
+        start = index(start, start // factor)
+        stop = index(stop, -(-stop // factor))
+        return xd[start:stop], yd[start:stop]
+
+
+def adaptive_grid(function, xmin, xmax, points=200, tolerance=1e-3,
+                  max_points=10000, passes=10):
+    """Evaluates function on a grid over [xmin, xmax] that starts uniform
+    and is bisected wherever the midpoint deviates by more than tolerance
+    from the straight line between its neighbours, so that points are
+    dense where the curvature is high and sparse elsewhere."""
+    x = np.linspace(xmin, xmax, points)
+    y = np.asarray(function(x), dtype=float)
+    for _ in range(passes):
+        xm = (x[1:] + x[:-1]) / 2
+        ym = np.asarray(function(xm), dtype=float)
+        refine = np.abs(ym - (y[1:] + y[:-1]) / 2) > tolerance
+        n = np.count_nonzero(refine)
+        if n == 0 or len(x) + n > max_points:
+            break
+        x = np.concatenate((x, xm[refine]))
+        y = np.concatenate((y, ym[refine]))
+        order = np.argsort(x, kind="stable")
+        x, y = x[order], y[order]
+    return x, y
+
+
+class frameTimer:
+    """Exponential moving average of the time spent painting a widget."""
+    def __init__(self, widget, smoothing=0.1):
+        self.smoothing = smoothing
+        self.frame_time = None
+        paint_event = widget.paintEvent
+
+        def timed_paint_event(event):
+            t0 = time.perf_counter()
+            paint_event(event)
+            dt = time.perf_counter() - t0
+            if self.frame_time is None:
+                self.frame_time = dt
+            else:
+                self.frame_time += self.smoothing * (dt - self.frame_time)
+        widget.paintEvent = timed_paint_event
+
+    def text(self):
+        if self.frame_time is None:
+            return ""
+        return "frame: {:.1f} ms".format(self.frame_time * 1e3)
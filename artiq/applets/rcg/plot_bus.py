@@ -0,0 +1,255 @@
+"""
+Publish/subscribe bus for RCG plot updates.
+
+    python -m artiq.applets.rcg.plot_bus
+
+Experiments publish every plot update once to the bus, without waiting for
+a reply, and the bus forwards it to every subscribed RCG. A new subscriber
+first receives the latest update of every curve on the bus, so a grapher
+started in the middle of a scan shows all of it.
+
+Updates resend the whole curve, so a newer update of a curve replaces an
+older one still queued for a subscriber. A slow subscriber therefore gets
+the latest state of every curve instead of every update. It never slows
+down the publishers or the other subscribers, and it is disconnected if it
+stops reading.
+"""
+import argparse
+import asyncio
+import errno
+import logging
+import socket
+import time
+from collections import OrderedDict
+from sipyco import pyon
+import artiq.applets.rcg.RealComplicatedGrapherConfig as conf
+
+
+logger = logging.getLogger(__name__)
+
+
+def curve_key(update):
+    return (update.get("tab_name", "Current"), update.get("plot_name"),
+            update.get("plot_title", "new_plot"))
+
+
+class subscriberQueue:
+    """Updates waiting to be sent to a subscriber, at most one per curve."""
+    def __init__(self, updates=()):
+        self.pending = OrderedDict(updates)
+        self.event = asyncio.Event()
+        if self.pending:
+            self.event.set()
+
+    def put(self, key, update):
+        self.pending.pop(key, None)
+        self.pending[key] = update
+        self.event.set()
+
+    async def get(self):
+        await self.event.wait()
+        updates = list(self.pending.values())
+        self.pending.clear()
+        self.event.clear()
+        return updates
+
+
+class plotBus:
+    def __init__(self, max_curves=conf.bus_max_curves, timeout=conf.bus_timeout):
+        # Latest update of the most recently updated curves
+        self.curves = OrderedDict()
+        self.max_curves = max_curves
+        self.timeout = timeout
+        self.subscribers = set()
+
+    def publish(self, update):
+        key = curve_key(update)
+        self.curves.pop(key, None)
+        self.curves[key] = update
+        while len(self.curves) > self.max_curves:
+            self.curves.popitem(last=False)
+        for queue in self.subscribers:
+            queue.put(key, update)
+
+    async def handle_publisher(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    self.publish(pyon.decode(line.decode()))
+                except Exception:
+                    logger.warning("Invalid plot update", exc_info=True)
+        except (ConnectionError, ValueError):
+            # ValueError: update longer than the stream limit
+            logger.warning("Plot publisher dropped", exc_info=True)
+        finally:
+            writer.close()
+
+    async def handle_subscriber(self, reader, writer):
+        queue = subscriberQueue(self.curves.items())
+        self.subscribers.add(queue)
+        try:
+            while True:
+                updates = await queue.get()
+                writer.write((pyon.encode(updates) + "\n").encode())
+                await asyncio.wait_for(writer.drain(), self.timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Dropping plot subscriber that stopped reading")
+        except ConnectionError:
+            pass
+        finally:
+            self.subscribers.discard(queue)
+            writer.close()
+
+    async def start(self, host, publish_port, subscribe_port):
+        limit = conf.bus_max_message
+        self.servers = [
+            await asyncio.start_server(self.handle_publisher, host, publish_port, limit=limit),
+            await asyncio.start_server(self.handle_subscriber, host, subscribe_port)]
+
+    async def stop(self):
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+
+
+class busPublisher:
+    """Publishes plot updates to the bus without ever blocking, with the
+    interface of an RCG pc_rpc client.
+
+    Updates are sent from a buffer of at most max_buffer bytes. While the
+    bus is unreachable, or the buffer is full, updates are dropped and
+    counted in dropped. Reconnecting is attempted at most every retry
+    seconds.
+    """
+    def __init__(self, host=conf.bus_host, port=conf.bus_publish_port,
+                 max_buffer=2**26, retry=1.):
+        self.host = host
+        self.port = port
+        self.max_buffer = max_buffer
+        self.retry = retry
+        self.sock = None
+        self.buffer = bytearray()
+        self.next_connect = 0
+        self.published = 0
+        self.dropped = 0
+
+    def connect(self):
+        now = time.monotonic()
+        if now < self.next_connect:
+            return False
+        self.next_connect = now + self.retry
+        try:
+            family, type_, proto, _, address = socket.getaddrinfo(
+                self.host, self.port, type=socket.SOCK_STREAM)[0]
+            self.sock = socket.socket(family, type_, proto)
+            self.sock.setblocking(False)
+            error = self.sock.connect_ex(address)
+        except OSError:
+            self.disconnect()
+            return False
+        if error not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            self.disconnect()
+            return False
+        return True
+
+    def disconnect(self):
+        if self.sock is not None:
+            self.sock.close()
+        self.sock = None
+        self.dropped += self.buffer.count(b"\n")
+        self.buffer.clear()
+
+    def plot(self, x, y, tab_name="Current", plot_name=None,
+             plot_title="new_plot", append=False, file_=None, range_guess=None):
+        return self.publish(dict(x=x, y=y, tab_name=tab_name, plot_name=plot_name,
+                                 plot_title=plot_title, append=append, file_=file_,
+                                 range_guess=range_guess))
+
+    def publish(self, update):
+        if self.sock is None and not self.connect():
+            self.dropped += 1
+            return False
+        message = (pyon.encode(update) + "\n").encode()
+        if len(self.buffer) + len(message) > self.max_buffer:
+            self.dropped += 1
+            self.flush()
+            return False
+        self.buffer += message
+        self.published += 1
+        self.flush()
+        return True
+
+    def flush(self):
+        try:
+            while self.buffer:
+                del self.buffer[:self.sock.send(self.buffer)]
+        except (BlockingIOError, InterruptedError):
+            # Connecting, or the socket buffer is full: send on the next update
+            pass
+        except OSError:
+            self.disconnect()
+
+    def close_rpc(self, timeout=1.):
+        """Sends what is left in the buffer, waiting at most timeout
+        seconds, and disconnects."""
+        if self.sock is not None and self.buffer:
+            try:
+                self.sock.settimeout(timeout)
+                self.sock.sendall(self.buffer)
+                self.buffer.clear()
+            except OSError:
+                pass
+        self.disconnect()
+
+
+async def subscribe(plot_batch, host=conf.bus_host, port=conf.bus_subscribe_port, retry=5.):
+    """Calls plot_batch with the updates received from the bus, reconnecting
+    every retry seconds while the bus is unreachable."""
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port, limit=conf.bus_max_message)
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    plot_batch(pyon.decode(line.decode()))
+            finally:
+                writer.close()
+        except (OSError, ValueError):
+            logger.debug("Plot bus connection lost", exc_info=True)
+        await asyncio.sleep(retry)
+
+
+def get_argparser():
+    parser = argparse.ArgumentParser(description="RCG plot bus")
+    parser.add_argument("--bind", default=conf.bus_host,
+                        help="address to listen on (default: %(default)s)")
+    parser.add_argument("--publish-port", type=int, default=conf.bus_publish_port,
+                        help="port for experiments (default: %(default)s)")
+    parser.add_argument("--subscribe-port", type=int, default=conf.bus_subscribe_port,
+                        help="port for graphers (default: %(default)s)")
+    return parser
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    args = get_argparser().parse_args()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    bus = plotBus()
+    loop.run_until_complete(bus.start(args.bind, args.publish_port, args.subscribe_port))
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(bus.stop())
+        loop.close()
+
+
+if __name__ == "__main__":
+    main()
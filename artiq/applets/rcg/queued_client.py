@@ -0,0 +1,157 @@
+import itertools
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+from sipyco.pc_rpc import Client
+from artiq.applets.rcg.plot_bus import curve_key
+import artiq.applets.rcg.RealComplicatedGrapherConfig as conf
+
+
+logger = logging.getLogger(__name__)
+
+
+def plot_update(args, kwargs):
+    return dict(zip(("x", "y"), args), **kwargs)
+
+
+def rcg_coalesce(method, args, kwargs):
+    """Appending plot and tail calls replace the whole curve, so only the
+    latest one of every curve needs to be sent."""
+    if method == "plot" and kwargs.get("append"):
+        return curve_key(plot_update(args, kwargs))
+    if method == "tail":
+        return ("tail",) + curve_key(kwargs)
+    return None
+
+
+class queuedClient:
+    """pc_rpc client whose calls return immediately and are sent by a
+    background thread, so that a slow or unreachable server never stalls
+    the caller.
+
+    Calls are queued, up to max_queue of them, and the oldest are dropped
+    when the queue is full. Calls for which coalesce(method, args, kwargs)
+    returns the key of a call still queued replace it. With batch set,
+    consecutive queued plot calls are sent together with that method of the
+    server, as in RemotePlotting.plot_batch, in their place among the other
+    calls. The connection is made, and remade
+    after errors, in the background every retry seconds. Return values of
+    the server are discarded.
+    """
+    def __init__(self, host, port, target, coalesce=None, batch=None,
+                 max_queue=conf.client_max_queue, timeout=conf.client_timeout, retry=1.):
+        self.host = host
+        self.port = port
+        self.target = target
+        self.coalesce = coalesce
+        self.batch = batch
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retry = retry
+        self.client = None
+        self.pending = OrderedDict()
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.closing = False
+        self.queued = self.sent = self.coalesced = self.dropped = 0
+        self.thread = threading.Thread(target=self.send_loop, daemon=True)
+        self.thread.start()
+
+    def __getattr__(self, method):
+        if method.startswith("_"):
+            raise AttributeError(method)
+        return lambda *args, **kwargs: self.call(method, args, kwargs)
+
+    def call(self, method, args, kwargs):
+        # The caller may reuse its arrays, so send copies
+        args = [np.array(a) if isinstance(a, np.ndarray) else a for a in args]
+        kwargs = {k: np.array(v) if isinstance(v, np.ndarray) else v
+                  for k, v in kwargs.items()}
+        key = self.coalesce(method, args, kwargs) if self.coalesce else None
+        if key is None:
+            key = next(self.counter)
+        with self.condition:
+            self.queued += 1
+            if key in self.pending:
+                self.coalesced += 1
+            elif len(self.pending) >= self.max_queue:
+                self.pending.popitem(last=False)
+                self.dropped += 1
+            self.pending[key] = method, args, kwargs
+            self.condition.notify()
+
+    def stats(self):
+        return {"queued": self.queued, "sent": self.sent,
+                "coalesced": self.coalesced, "dropped": self.dropped,
+                "pending": len(self.pending)}
+
+    def connect(self):
+        try:
+            self.client = Client(self.host, self.port, self.target, timeout=self.timeout)
+        except Exception:
+            logger.debug("Couldn't connect to %s", self.target, exc_info=True)
+            self.client = None
+        return self.client is not None
+
+    def disconnect(self):
+        if self.client is not None:
+            try:
+                self.client.close_rpc()
+            except Exception:
+                pass
+        self.client = None
+
+    def send(self, calls):
+        if self.batch is None:
+            runs = [(False, calls)]
+        else:
+            runs = [(batched, list(run)) for batched, run
+                    in itertools.groupby(calls, lambda call: call[0] == "plot")]
+        for batched, run in runs:
+            if batched:
+                getattr(self.client, self.batch)([plot_update(args, kwargs)
+                                                  for _, args, kwargs in run])
+                self.sent += len(run)
+                continue
+            for method, args, kwargs in run:
+                getattr(self.client, method)(*args, **kwargs)
+                self.sent += 1
+
+    def send_loop(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closing:
+                    self.condition.wait()
+                if not self.pending:
+                    break
+            # Connect without holding the lock, so that calls never wait
+            if self.client is None and not self.connect():
+                with self.condition:
+                    if self.closing:
+                        self.dropped += len(self.pending)
+                        self.pending.clear()
+                        break
+                    self.condition.wait(self.retry)
+                continue
+            with self.condition:
+                calls = list(self.pending.values())
+                self.pending.clear()
+            sent = self.sent
+            try:
+                self.send(calls)
+            except Exception:
+                logger.debug("Sending to %s failed", self.target, exc_info=True)
+                with self.condition:
+                    self.dropped += len(calls) - (self.sent - sent)
+                self.disconnect()
+        self.disconnect()
+
+    def close_rpc(self, timeout=1.):
+        """Sends the queued calls, waiting at most timeout seconds, and
+        stops the background thread. Calls still queued then are sent
+        unless the server is unreachable, without waiting for them."""
+        with self.condition:
+            self.closing = True
+            self.condition.notify()
+        self.thread.join(timeout)
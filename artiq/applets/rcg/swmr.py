@@ -0,0 +1,93 @@
+"""
+Data files that experiments write in HDF5 single-writer/multiple-reader
+(SWMR) mode, for the RCG to read scans while they are taken.
+
+With conf.swmr_tailing, an experiment creates all datasets of its data file,
+switches the file to SWMR mode and keeps it open, writing every new point
+into it. Instead of sending the curve to the RCG it only calls
+RemotePlotting.tail with the names of the datasets and the number of points,
+and the RCG reads them from the file. Datasets can't be created in SWMR
+mode, but they can be grown if they are chunked.
+"""
+from collections import OrderedDict
+import h5py
+import numpy as np
+import artiq.applets.rcg.RealComplicatedGrapherConfig as conf
+
+
+def open_data_file(path):
+    """Opens a data file for reading, also while it is being written in SWMR
+    mode, which other readers can't open."""
+    try:
+        return h5py.File(path, "r")
+    except OSError:
+        return h5py.File(path, "r", swmr=True)
+
+
+def write_points(dataset, data, start=0):
+    """Writes data to dataset from index start on, growing the dataset if
+    needed, and flushes it for SWMR readers."""
+    data = np.asarray(data)
+    end = start + len(data)
+    if dataset.shape[0] < end:
+        dataset.resize((end,))
+    dataset[start:end] = data
+    dataset.flush()
+
+
+class swmrReader:
+    """Data files being written by experiments, kept open in SWMR mode so
+    that reading new points doesn't reopen the file. At most max_files are
+    open, the least recently read are closed first.
+
+    The points read from every dataset are kept, with room to grow, until
+    its file is closed, so that only the points written since the last read
+    are read from the file."""
+    def __init__(self, max_files=conf.swmr_max_files):
+        self.max_files = max_files
+        self.files = OrderedDict()
+        # (path, dataset): (points, number of points read)
+        self.data = dict()
+
+    def open(self, path):
+        try:
+            f = self.files.pop(path)
+        except KeyError:
+            f = h5py.File(path, "r", swmr=True)
+            while len(self.files) >= self.max_files:
+                self.close(next(iter(self.files)))
+        self.files[path] = f
+        return f
+
+    def read(self, path, dataset, points=None):
+        """Returns the first points of the dataset of the scan_data group
+        of the data file at path, or all of it with points None. Points
+        already read are taken to be final."""
+        key = path, dataset
+        try:
+            dataset = self.open(path)["scan_data"][dataset]
+            dataset.refresh()
+            points = dataset.shape[0] if points is None else min(points, dataset.shape[0])
+            data, last = self.data.get(key, (None, 0))
+            if data is None or points < last:
+                data, last = np.empty(max(points, 16), dataset.dtype), 0
+            elif points > len(data):
+                grown = np.empty(max(points, 2 * len(data)), data.dtype)
+                grown[:last] = data[:last]
+                data = grown
+            data[last:points] = dataset[last:points]
+            self.data[key] = data, points
+            return data[:points]
+        except Exception:
+            self.close(path)
+            raise
+
+    def close(self, path=None):
+        """Closes the data file at path, or all of them with path None."""
+        paths = list(self.files) if path is None else [path]
+        for path in paths:
+            f = self.files.pop(path, None)
+            if f is not None:
+                f.close()
+            for key in [key for key in self.data if key[0] == path]:
+                del self.data[key]
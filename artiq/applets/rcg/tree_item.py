@@ -1,19 +1,29 @@
+import logging
 import PyQt5
 from PyQt5 import QtWidgets, QtGui, QtCore
 from datetime import datetime
 import pyqtgraph
 import pyperclip
+from artiq.applets.rcg.curve_buffer import curveBuffer
+from artiq.applets.rcg.level_of_detail import lodCache
+
+
+logger = logging.getLogger(__name__)
+
 
 class checkStateChanged(QtCore.QObject):
     checkStateChanged = QtCore.pyqtSignal(str, bool)
 
 class treeItem(QtWidgets.QTreeWidgetItem):
     signal = checkStateChanged()
-    def __init__(self, parent_, txt, x, y, axes, color, show_points, file_=None):
+    def __init__(self, parent_, txt, x, y, axes, color, show_points, file_=None, loader=None):
         QtWidgets.QTreeWidgetItem.__init__(self)
-        self.axes = axes; self.x = x; self.y = y; self.name = txt
+        self.axes = axes; self.curve = curveBuffer(x, y); self.name = txt
+        self.lod = lodCache(); self.points_shown = show_points
         self.color = color; self.show_points = show_points
         self.file = file_
+        # Called to fetch x and y when the curve is first plotted
+        self.loader = loader
         self.parent_ = parent_
         self.plot_item = None
         self.is_selected = False
@@ -23,18 +33,56 @@ class treeItem(QtWidgets.QTreeWidgetItem):
         font.setBold(True)
         self.setFont(0, font)
         self.setCheckState(0, 2)
-        self.plot()
+        if loader is None:
+            self.plot()
         self.signal.checkStateChanged.connect(self.item_check_state_changed)
 
+    @property
+    def x(self):
+        return self.curve.x
+
+    @property
+    def y(self):
+        return self.curve.y
+
+    def getData(self):
+        return self.x, self.y
+
+    def update_data(self, x, y):
+        self.curve.update(x, y)
+        if self.plot_item is not None:
+            self.redraw()
+
+    def redraw(self):
+        x, y, show_points = self.parent_.displayed_data(self)
+        self.plot_item.setData(x, y)
+        if show_points != self.points_shown:
+            self.plot_item.setSymbol("o" if show_points else None)
+            self.plot_item.setSymbolBrush(self.color if show_points else None)
+            self.points_shown = show_points
+
+    def load(self):
+        if self.loader is None:
+            return
+        loader, self.loader = self.loader, None
+        try:
+            x, y = loader()
+        except Exception:
+            logger.warning("Couldn't load {}".format(self.name), exc_info=True)
+            return
+        self.curve.reset(x, y, sort=False)
+
     def plot(self):
+        self.load()
         if self.plot_item is not None:
             self.remove_plot()
-        self.plot_item = self.axes.plot(x=self.x, y=self.y,
+        x, y, show_points = self.parent_.displayed_data(self)
+        self.plot_item = self.axes.plot(x=x, y=y,
                                         pen=pyqtgraph.mkPen(self.color, width=2),
-                                        symbolBrush=self.color if self.show_points else None,
-                                        symbol="o" if self.show_points else None)
+                                        symbolBrush=self.color if show_points else None,
+                                        symbol="o" if show_points else None)
+        self.points_shown = show_points
         self.plot_item.sigClicked.connect(self.curve_clicked)
-        self.plot_item.sigPlotChanged.connect(self.plot_changed)
         try:
             self.setForeground(0, QtGui.QBrush(QtGui.QColor(*self.color)))
         except TypeError:
@@ -101,6 +149,3 @@ class treeItem(QtWidgets.QTreeWidgetItem):
             self.plot()
         else:
             self.remove_plot()
-
-    def plot_changed(self, curve):
-        self.x, self.y = curve.getData()
@@ -1,4 +1,7 @@
+import os
+
 client_list = ('lattice', 'cct', 'sqip', 'space time')
 client_name = 'lattice'
 global_address = '192.168.169.49'
 global_password = 'lab'
+vault_mirror_socket = os.path.join(os.path.expanduser('~'), '.vault_mirror.sock')
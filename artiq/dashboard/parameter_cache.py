@@ -0,0 +1,122 @@
+"""
+Cache of Parameter Vault values shared by the docks of the dashboard.
+
+Docks used to fetch a parameter with get_parameter every time the parameter
+changed signal named it, each of them on its own, so bursts of changes made
+as many requests as changes times docks. The cache listens to the signal
+once per connection and emits changed with the new value, so that docks
+don't make any requests of their own.
+
+The signal names the changed parameter, (collection, name). Parameters
+changed within delay seconds are fetched together with one request packet,
+and parameters written by the ParameterWriters of the connection aren't
+fetched at all, since the writers update the cache with the values they
+wrote. Should the signal also carry the value, it is used as is.
+"""
+import logging
+from collections import OrderedDict
+from PyQt5 import QtCore
+from twisted.internet.defer import inlineCallbacks
+
+
+logger = logging.getLogger(__name__)
+parameterchangedID = 612512
+fetch_delay = 0.05
+
+
+class ParameterCache(QtCore.QObject):
+    """Values of the parameters changed since the cache started listening,
+    with the version of the cache in which they changed."""
+    changed = QtCore.pyqtSignal(object, object)
+
+    def __init__(self, acxn, delay=fetch_delay, clock=None):
+        QtCore.QObject.__init__(self)
+        self.acxn = acxn
+        self.delay = delay
+        if clock is None:
+            from twisted.internet import reactor as clock
+        self.clock = clock
+        self.values = dict()
+        self.version = 0
+        self.stale = OrderedDict()
+        self.call = None
+        self.server = None
+        # ParameterWriters, whose busy(key) tells which parameters they are
+        # writing
+        self.writers = []
+        self.requests = 0
+
+    @inlineCallbacks
+    def listen(self):
+        """Adds the listener of the parameter changed signal, once for
+        every connection to the Parameter Vault."""
+        p = yield self.acxn.get_server("ParameterVault")
+        if p is self.server:
+            return
+        self.server = p
+        try:
+            context = yield self.acxn.context()
+            yield p.signal__parameter_change(parameterchangedID, context=context)
+            yield p.addListener(listener=self.on_parameter_change, source=None,
+                                ID=parameterchangedID, context=context)
+        except:
+            self.server = None
+            raise
+        # Changes made while not listening are missed
+        self.catch_up()
+
+    def get(self, key, default=None):
+        version, value = self.values.get(key, (None, default))
+        return value
+
+    def update(self, key, value):
+        self.version += 1
+        self.values[key] = self.version, value
+        self.changed.emit(key, value)
+
+    def on_parameter_change(self, *args):
+        message = args[1]
+        key = tuple(message[:2])
+        if len(message) > 2:
+            self.update(key, message[2])
+        elif not any(writer.busy(key) for writer in self.writers):
+            self.invalidate([key])
+
+    def invalidate(self, keys):
+        """Fetches the keys, together with others invalidated before the
+        delay ends."""
+        self.stale.update(dict.fromkeys(keys))
+        if self.stale and self.call is None:
+            self.call = self.clock.callLater(self.delay, self.fetch)
+
+    def catch_up(self):
+        """Fetches all cached parameters again."""
+        self.invalidate(list(self.values))
+
+    @inlineCallbacks
+    def fetch(self):
+        self.call = None
+        keys, self.stale = list(self.stale), OrderedDict()
+        try:
+            p = yield self.acxn.get_server("ParameterVault")
+            packet = p.packet()
+            for i, key in enumerate(keys):
+                packet.get_parameter(list(key), key="get {}".format(i))
+            self.requests += 1
+            ans = yield packet.send()
+        except Exception:
+            logger.warning("Failed to get parameters %s",
+                           ", ".join(".".join(key) for key in keys), exc_info=True)
+            return
+        for i, key in enumerate(keys):
+            self.update(key, ans["get {}".format(i)])
+
+
+_caches = dict()
+
+
+def get_parameter_cache(acxn):
+    """The ParameterCache shared by the docks of the connection acxn."""
+    if acxn not in _caches:
+        _caches[acxn] = ParameterCache(acxn)
+    return _caches[acxn]
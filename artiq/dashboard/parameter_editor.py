@@ -10,50 +10,17 @@ import numpy as np
 from PyQt5 import QtCore, QtWidgets, QtGui
 from sipyco.pc_rpc import Client
 from artiq.gui.tools import LayoutWidget
+from artiq.dashboard.parameter_index import get_parameter_index
+from artiq.dashboard.parameter_model import ParameterTreeModel, ParameterFilterModel
+from artiq.dashboard.parameter_cache import get_parameter_cache
+from artiq.dashboard.parameter_writer import get_parameter_writer
+from artiq.dashboard.registry_loader import RegistryLoader
 import logging
 from twisted.internet.defer import inlineCallbacks
 
 logger = logging.getLogger(__name__)
 
 
-# Read all .py files under artiq-work and add their attributes to a list
-# of commonly_used_parameters.
-# Note that this only gets parameters used by subsequences. 
-# Parameters in accessed_params lists will not appear in this list
-# (since those are presumably specific to a particular experiment).
-commonly_used_parameters = []
-
-import os
-import imp
-import importlib
-import ast
-work_folder = os.path.join(os.path.expanduser("~"), "artiq-work")
-for path, subdirs, files in os.walk(work_folder):
-    for filename in files:
-        if filename.endswith(".py"):
-            experiment_file = os.path.join(path, filename)
-            classes = []
-            try:
-                with open(experiment_file) as f:
-                    node = ast.parse(f.read())
-                    classes = [n for n in node.body if isinstance(n, ast.ClassDef)]
-                    experiment_source = imp.load_source('', experiment_file, f)
-                    for class_ in classes:
-                        sequence_class = getattr(experiment_source, class_.name)
-                        d = sequence_class.__dict__
-                        for key, value in d.items():
-                            if type(value) == str:
-                                try:
-                                    c, v = value.split(".")
-                                except AttributeError:
-                                    continue
-                                except ValueError:
-                                    continue
-                                commonly_used_parameters.append(value)
-            except:
-                continue
-
-parameterchangedID = 612512
 types = ["parameter",
          "scan",  # Not used here
          "line_selection",
@@ -78,79 +45,48 @@ class ParameterEditorDock(QtWidgets.QDockWidget):
         global types
         self.types = types
 
-        self.cxn = None
-        try:
-            self.cxn = labrad.connect()
-        except:
-            logger.warning("Parameter Editor failed to connect to labrad.", exc_info=True)
-            self.setDisabled(True)
-        self.setup_listeners()
+        # Parameters used by subsequences. Parameters in accessed_params lists
+        # will not appear (since those are presumably specific to a particular
+        # experiment). The index is updated in the background.
+        self.common_params = dict()
+        if not accessed_params:
+            parameter_index = get_parameter_index()
+            parameter_index.updated.connect(self.update_common_params)
+            self.set_common_params(parameter_index.parameters())
+        # Values of all parameters, by collection
+        self.registry_values = dict()
+        # Expanded state of collections that haven't been loaded yet
+        self.expanded = [dict(), dict()]
+        self.scroll = None
+        self.unfiltered_state = None
         self.make_GUI()
-
-    def make_region_item(self, label):
-        item = QtWidgets.QTreeWidgetItem()
-        item.setText(0, label)
-        font = QtGui.QFont()
-        font.setBold(True)
-        item.setFont(0, font)
-        bgcolor = QtGui.QColor(192, 192, 192)
-        item.setBackground(0, bgcolor)
-        item.setBackground(1, bgcolor)
-        item.setFlags(item.flags() ^ QtCore.Qt.ItemIsSelectable)
-        self.table.addTopLevelItem(item)
-        self.region_widget_items[label] = item
-        return item
-
-    def make_collection_item(self, registry, collection, region_index):
-        item = QtWidgets.QTreeWidgetItem()
-        item.setText(0, collection)
-        font = QtGui.QFont()
-        font.setBold(True)
-        item.setFont(0, font)
-        item.setBackground(0, QtGui.QColor(248, 248, 248))
-        item.setBackground(1, QtGui.QColor(248, 248, 248))
-        item.setFlags(item.flags() ^ QtCore.Qt.ItemIsSelectable)
-        params = sorted(registry[collection].keys())
-        num_children = 0
-        for param in params:
-            try:
-                value = registry[collection][param]
-                child = QtWidgets.QTreeWidgetItem([param, None])
-                if num_children % 2 == 0:
-                    child.setBackground(0, QtGui.QColor(248, 248, 248))
-                else:
-                    child.setBackground(0, QtGui.QColor(228, 228, 228))
-                assert type(value) == tuple
-                assert value[0] in self.types
-                _child = EditorFactory.get_editor(value, self.acxn,
-                                                  (collection, param), child)
-                if _child is None:
-                    # Unrecognized registry key format, ignore
-                    continue
-                item.addChild(child)
-                size = QtCore.QSize()
-                size.setHeight(15)
-                child.setSizeHint(0, size)
-                child.setBackground(1, QtGui.QColor(248, 248, 248))
-                self.table.setItemWidget(child, 1, _child)
-                num_children += 1
-                self.param_widget_items[region_index][collection, param] = _child
-            except (AssertionError, TypeError):
-                # logger.info("Unrecognized parameter vault registry key, value "
-                #             "pair format for: {}, {}".format(collection, param))
-                continue
-        if num_children > 0:
-            return item
-        return None
+        # Changed values come from the cache shared by all docks
+        get_parameter_cache(self.acxn).changed.connect(self.refresh_values)
+        d = self.setup_listeners()
+        d.addCallback(lambda _: self.load_registry())
 
     def make_GUI(self):
         grid = LayoutWidget()
         self.setWidget(grid)
-        self.table = QtWidgets.QTreeWidget()
+        self.filter = QtWidgets.QLineEdit()
+        self.filter.setPlaceholderText("Filter")
+        self.filter.setClearButtonEnabled(True)
+        self.filter.textChanged.connect(self.on_filter_changed)
+        grid.addWidget(self.filter, 0, 0)
+
+        # Only visible rows are painted and editors are only created for the
+        # cell being edited, whatever the number of parameters
+        self.model = ParameterTreeModel(set(self.types) & set(EditorFactory.editor_versions))
+        self.proxy = ParameterFilterModel(self.model)
+        self.delegate = ParameterDelegate(self.acxn, self.proxy.node, self.model.set_value)
+        self.table = QtWidgets.QTreeView()
+        self.table.setModel(self.proxy)
+        self.table.setItemDelegateForColumn(1, self.delegate)
+        self.table.setUniformRowHeights(True)
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.AllEditTriggers)
         self.table.setFocusPolicy(QtCore.Qt.StrongFocus)
         self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectItems)
         self.table.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
-        self.table.setContextMenuPolicy(QtCore.Qt.ActionsContextMenu)
         self.table.setSortingEnabled(False)
         self.table.header().setStretchLastSection(False)
         p = QtGui.QPalette()
@@ -159,113 +95,123 @@ class ParameterEditorDock(QtWidgets.QDockWidget):
         self.table.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
         self.table.customContextMenuRequested.connect(self.open_menu)
         self.table.setIndentation(10)
-        grid.addWidget(self.table, 0, 0)
-
-        self.table.setHeaderLabels(["Collection", "Value"])
+        grid.addWidget(self.table, 1, 0)
 
-        self.region_widget_items = dict()
-        self.collection_widget_items = [dict(), dict()]
-        self.param_widget_items = [dict(), dict()]
-
-        if not self.cxn:
-            return
+        self.regions = dict()
+        self.collection_nodes = [dict(), dict()]
 
-        all_params_registry = dict()
-        common_params_registry = dict()
-        accessed_params_registry = dict()
-
-        r = self.cxn["registry"]
-
-        if self.accessed_params:
-            # accessed parameters list
-            for param in self.accessed_params:
-                param_split = param.split(".")
-                collection = param_split[0]
-                param_name = param_split[1]
-                if not collection in accessed_params_registry.keys():
-                    accessed_params_registry[collection] = dict()
-                r.cd("", "Servers", "Parameter Vault", collection)
-                accessed_params_registry[collection][param_name] = r.get(param_name)
-            for collection in sorted(accessed_params_registry.keys()):
-                collection_item = self.make_collection_item(accessed_params_registry, collection, region_index=0)
-                if collection_item:
-                    self.table.addTopLevelItem(collection_item)
-                    if self.expand_accessed_params:
-                        collection_item.setExpanded(True)
-                    else:
-                        collection_item.setExpanded(False)
-                    self.collection_widget_items[0][collection] = collection_item
-        else:
+        if not self.accessed_params:
             # set up top-level items for all parameters and common parameters
-            region_common_params_item = self.make_region_item("Commonly Used Parameters")
-            region_all_params_item = self.make_region_item("All Parameters")
-
-            # common parameters list
-            for param in commonly_used_parameters:
-                param_split = param.split(".")
-                collection = param_split[0]
-                param_name = param_split[1]
-                param_value = ""
-                try:
-                    r.cd("", "Servers", "Parameter Vault", collection)
-                    param_value = r.get(param_name)
-                except:
-                    continue
-                if not collection in common_params_registry.keys():
-                    common_params_registry[collection] = dict()
-                common_params_registry[collection][param_name] = param_value
-            for collection in sorted(common_params_registry.keys()):
-                collection_item = self.make_collection_item(common_params_registry, collection, region_index=0)
-                if collection_item:
-                    region_common_params_item.addChild(collection_item)
-                    self.collection_widget_items[0][collection] = collection_item
-
-            # all parameters list
-            r.cd("", "Servers", "Parameter Vault")
-            collections = r.dir()[0]
-            for collection in collections:
-                collection_dict = dict()
-                r.cd("", "Servers", "Parameter Vault", collection)
-                params = r.dir()[1]
-                for param in params:
-                    collection_dict[param] = r.get(param)
-                all_params_registry[collection] = collection_dict
-            for collection in sorted(all_params_registry.keys()):
-                collection_item = self.make_collection_item(all_params_registry, collection, region_index=1)
-                if collection_item:
-                    region_all_params_item.addChild(collection_item)
-                    self.collection_widget_items[1][collection] = collection_item
+            for label in ["Commonly Used Parameters", "All Parameters"]:
+                self.regions[label] = self.model.add_region(label)
 
         self.table.setColumnWidth(0, 225)
         self.table.setColumnWidth(1, 150)
         self.table.header().setFocusPolicy(QtCore.Qt.NoFocus)
 
-        self.cxn.disconnect()
+    def view_index(self, node):
+        return self.proxy.mapFromSource(self.model.index_of(node))
+
+    def on_filter_changed(self, text):
+        # Matches are shown expanded, the expanded state from before
+        # filtering is restored after it
+        if text and self.unfiltered_state is None:
+            self.unfiltered_state = self.save_state()
+        self.proxy.set_filter(text)
+        if text:
+            self.table.expandAll()
+        elif self.unfiltered_state is not None:
+            self.table.collapseAll()
+            self.restore_state(self.unfiltered_state)
+            self.unfiltered_state = None
+
+    @inlineCallbacks
+    def load_registry(self):
+        # Collections are loaded concurrently, with one request packet for
+        # all of their values, and added to the tree as they arrive
+        try:
+            registry = yield self.acxn.get_server("registry")
+            loader = RegistryLoader(registry, self.acxn.context)
+            if self.accessed_params:
+                params = dict()
+                for param in self.accessed_params:
+                    param_split = param.split(".")
+                    params.setdefault(param_split[0], set()).add(param_split[1])
+                yield loader.load(sorted(params), self.add_accessed_collection, params)
+            else:
+                collections = yield loader.collections()
+                yield loader.load(collections, self.add_collection)
+        except:
+            logger.warning("Parameter Editor failed to load parameters from labrad.",
+                           exc_info=True)
+            self.setDisabled(True)
+            return
+        if self.scroll is not None:
+            self.table.verticalScrollBar().setSliderPosition(self.scroll)
+
+    def insert_collection(self, parent, collection, values, region_index):
+        # Collections are kept sorted, whatever order they arrive in
+        node = self.model.set_collection(parent, collection, values)
+        if node is None:
+            return None
+        self.collection_nodes[region_index][collection] = node
+        if collection in self.expanded[region_index]:
+            self.table.setExpanded(self.view_index(node), self.expanded[region_index][collection])
+        return node
+
+    def add_accessed_collection(self, collection, values):
+        node = self.insert_collection(None, collection, values, 0)
+        if node is not None:
+            self.table.setExpanded(self.view_index(node), self.expand_accessed_params)
+
+    def add_collection(self, collection, values):
+        self.registry_values[collection] = values
+        self.insert_collection(self.regions["All Parameters"], collection, values, 1)
+        self.add_common_collection(collection)
+
+    def add_common_collection(self, collection):
+        values = self.registry_values.get(collection, dict())
+        common_values = dict((param, values[param])
+                             for param in self.common_params.get(collection, ())
+                             if param in values)
+        if common_values:
+            self.insert_collection(self.regions["Commonly Used Parameters"],
+                                   collection, common_values, 0)
+
+    def set_common_params(self, params):
+        self.common_params = dict()
+        for param in params:
+            param_split = param.split(".")
+            self.common_params.setdefault(param_split[0], []).append(param_split[1])
+
+    def update_common_params(self, params):
+        # The parameter index found new or removed parameters
+        self.set_common_params(params)
+        if "Commonly Used Parameters" not in self.regions:
+            return
+        self.expanded[0].update(self.expanded_collections(0))
+        self.model.clear(self.regions["Commonly Used Parameters"])
+        self.collection_nodes[0].clear()
+        for collection in self.registry_values:
+            self.add_common_collection(collection)
 
     @inlineCallbacks
     def setup_listeners(self):
         try:
             yield self.acxn.connect(password='lab')
-            context = yield self.acxn.context()
-            p = yield self.acxn.get_server("ParameterVault")
-            yield p.signal__parameter_change(parameterchangedID, context=context)
-            yield p.addListener(listener=self.refresh_values, source=None,
-                                ID=parameterchangedID, context=context)
+            yield get_parameter_cache(self.acxn).listen()
         except:
             import traceback
             logger.warning(traceback.format_exc())
             logger.warning("failed to add parameter changed listener for dock: " + self.objectName())
 
-    @inlineCallbacks
-    def refresh_values(self, *args):
-        loc = args[1]
-        p = yield self.acxn.get_server("ParameterVault")
-        for region_index in [0,1]:
-            try:
-                val = yield p.get_parameter(loc)
-                self.param_widget_items[region_index][loc].update_value(val)
-            except KeyError:
-                pass
+    def refresh_values(self, loc, val):
+        if loc not in self.model.params or get_parameter_writer(self.acxn).busy(loc):
+            # Values of parameters being written are older than the editors'
+            return
+        self.model.update_parameter(loc, val)
+        if loc in self.delegate.editors:
+            self.delegate.editors[loc].update_value(val)
 
     def open_menu(self, position):
         menu = QtWidgets.QMenu()
@@ -280,7 +226,8 @@ class ParameterEditorDock(QtWidgets.QDockWidget):
         menu.exec_(self.table.viewport().mapToGlobal(position))
 
     def on_edit_action(self, *params):
-        if len(self.table.selectedItems()) == 0:
+        node = self.proxy.node(self.table.currentIndex())
+        if node.key is None:
             return
         try:
             cxn = labrad.connect()
@@ -289,9 +236,7 @@ class ParameterEditorDock(QtWidgets.QDockWidget):
             logger.error("In trying to edit registry, failed to "
                          "connect to labrad.", exc_info=True)
             return
-        sitem = self.table.selectedItems()[0]
-        name = sitem.text(0)
-        collection = sitem.parent().text(0)
+        collection, name = node.key
         r.cd("", "Servers", "Parameter Vault", collection)
         item_info = r.get(name)
         self.edit_menu = editInputMenu(collection, name, item_info,
@@ -323,28 +268,32 @@ class ParameterEditorDock(QtWidgets.QDockWidget):
         event.ignore()
         self.exit_request.set()
 
+    def expanded_collections(self, region_index):
+        return dict((collection, self.table.isExpanded(self.view_index(node)))
+                    for collection, node in self.collection_nodes[region_index].items())
+
     def save_state(self):
-        dr = dict((x, y.isExpanded()) for x, y in self.region_widget_items.items())
-        d0 = dict((x, y.isExpanded()) for x, y in self.collection_widget_items[0].items())
-        d1 = dict((x, y.isExpanded()) for x, y in self.collection_widget_items[1].items())
+        dr = dict((x, self.table.isExpanded(self.view_index(y))) for x, y in self.regions.items())
         return {"scroll": self.table.verticalScrollBar().value(),
                "geometry": bytes(self.saveGeometry()),
                "expanded_r": dr,
-               "expanded_0": d0,
-               "expanded_1": d1}
-
-    def restore_widget_items_state(self, state, state_key, widget_items):
-        d = state[state_key]
-        dkeys = widget_items.keys()
-        for key, value in d.items():
-            if key in dkeys and value:
-                widget_items[key].setExpanded(True)
+               "expanded_0": self.expanded_collections(0),
+               "expanded_1": self.expanded_collections(1)}
 
     def restore_state(self, state):
         self.restoreGeometry(QtCore.QByteArray(state["geometry"]))
-        self.restore_widget_items_state(state, "expanded_r", self.region_widget_items)
-        self.restore_widget_items_state(state, "expanded_0", self.collection_widget_items[0])
-        self.restore_widget_items_state(state, "expanded_1", self.collection_widget_items[1])
+        for key, value in state["expanded_r"].items():
+            if key in self.regions and value:
+                self.table.setExpanded(self.view_index(self.regions[key]), True)
+        # Collections that are still loading are expanded when added
+        for region_index in [0, 1]:
+            expanded = state["expanded_{}".format(region_index)]
+            self.expanded[region_index].update(expanded)
+            for key, value in expanded.items():
+                if key in self.collection_nodes[region_index] and value:
+                    node = self.collection_nodes[region_index][key]
+                    self.table.setExpanded(self.view_index(node), True)
+        self.scroll = state["scroll"]
         self.table.verticalScrollBar().setSliderPosition(state["scroll"])
 
 class editInputMenu(QtWidgets.QDialog):
@@ -440,14 +389,7 @@ class editInputMenu(QtWidgets.QDialog):
         r = self.cxn.registry
         p = self.cxn.parametervault
         r.cd("", "Servers", "Parameter Vault", self.collection)
-        for region_index in [0,1]:
-            try:
-                widget = self.parent.param_widget_items[region_index][self.collection, self.name]
-                widget.min_ = self.item[1][0]#U(float(self.item[1][0]), self.units)
-                widget.max_ =  self.item[1][1]#U(float(self.item[1][1]), self.units)
-                widget.state = self.item[1]
-            except KeyError:
-                pass
+        self.parent.model.set_value((self.collection, self.name), self.item)
         r.set(self.name, self.item)
         p.set_parameter(self.collection, self.name, self.item, True)
 
@@ -457,15 +399,7 @@ class editInputMenu(QtWidgets.QDialog):
         d = dict(self.item[1][1])
         d[key] = sender.text()
         self.item = (self.item[0], (self.item[1][0], list(d.items())))
-        for region_index in [0,1]:
-            try:
-                widget = self.parent.param_widget_items[region_index][self.collection, self.name]
-                widget.state = self.item[1]
-                widget.clear()
-                widget.addItems(d.values())
-                widget.setCurrentIndex(widget.findText(d[self.item[1][0]]))
-            except KeyError:
-                pass
+        self.parent.model.set_value((self.collection, self.name), self.item)
         r = self.cxn.registry
         p = self.cxn.parametervault
         r.cd("", "Servers", "Parameter Vault", self.collection)
@@ -486,12 +420,7 @@ class editInputMenu(QtWidgets.QDialog):
                 val = np.append(val, nmax + (i + 1) * 2)
         elif diff < 0:
             val = val[:diff]
-        for region_index in [0,1]:
-            try:
-                widget = self.parent.param_widget_items[region_index][self.collection, self.name]
-                widget.update_value(val)
-            except KeyError:
-                pass
+        self.parent.model.set_value((self.collection, self.name), (self.item[0], val))
         r = self.cxn.registry
         p = self.cxn.parametervault
         p.set_parameter(self.collection, self.name, val)
@@ -585,9 +514,6 @@ class newParamMenu(QtWidgets.QDialog):
 class EditorFactory():
     editor = None
     editor_versions = dict()
-    def __init__(self):
-        self.p = None
-        self.r = None
 
     @classmethod
     def register(cls):
@@ -604,23 +530,6 @@ class EditorFactory():
     def check_bounds(self, val):
         return True
 
-    @inlineCallbacks
-    def check_connection(self, cxn):
-        try:
-            if self.p is None:
-                self.p = yield cxn.get_server("ParameterVault")
-            else:
-                yield self.p.ID
-            if self.r is None:
-                self.r = yield cxn.get_server("registry")
-            else:
-                yield self.r.ID
-            self.setDisabled(False)
-            return True
-        except:
-            self.setDisabled(True)
-            return False
-
     def on_param_changed_locally(self, val):
         pass
 
@@ -632,6 +541,9 @@ class BaseEditor(QtWidgets.QWidget, EditorFactory):
     def __init__(self, *params):
         self.state, self.acxn, descr, self.prt = params
         self.collection, self.name = descr
+        # Changes are written to the Parameter Vault and the registry by
+        # the writer, which coalesces them
+        self.writer = get_parameter_writer(self.acxn)
 
     def wheelEvent(self, *args, **kwargs):
         # Prevent widgets from interacting with mouse wheel
@@ -651,14 +563,8 @@ class BoolEditor(QtWidgets.QCheckBox, BaseEditor):
 
         self.stateChanged.connect(self.on_param_changed_locally)
 
-    @inlineCallbacks
     def on_param_changed_locally(self, val):
-        if self.check_connection(self.acxn):
-            yield self.p.set_parameter([self.collection, self.name, bool(val)])
-            # HACK: avoid having to save parameters to registry through server
-            # why do we even use the registry??
-            yield self.r.cd("", "Servers", "Parameter Vault", self.collection)
-            yield self.r.set(self.name, (self.editor, bool(val)))
+        self.writer.write(self.collection, self.name, bool(val), (self.editor, bool(val)))
 
     def update_value(self, val):
         if self.state == val:
@@ -687,16 +593,10 @@ class SelectionSimpleEditor(QtWidgets.QComboBox, BaseEditor):
 
         self.currentIndexChanged.connect(self.on_param_changed_locally)
 
-    @inlineCallbacks
     def on_param_changed_locally(self, idx):
-        if self.check_connection(self.acxn):
-            val = self.currentText()
-            self.state = val, self.state[1]
-            yield self.p.set_parameter([self.collection, self.name, self.state])
-            # HACK: avoid having to save parameters to registry through server
-            # why do we even use the registry??
-            yield self.r.cd("", "Servers", "Parameter Vault", self.collection)
-            yield self.r.set(self.name, (self.editor, self.state))
+        val = self.currentText()
+        self.state = val, self.state[1]
+        self.writer.write(self.collection, self.name, self.state, (self.editor, self.state))
 
     def update_value(self, val):
         if self.state == val:
@@ -728,20 +628,14 @@ class LineSelectionEditor(QtWidgets.QComboBox, BaseEditor):
 
         self.currentIndexChanged.connect(self.on_param_changed_locally)
 
-    @inlineCallbacks
     def on_param_changed_locally(self, idx):
-        if self.check_connection(self.acxn):
-            _val = self.currentText()
-            if _val == "":
-                return
-            d = dict((x, y) for y, x in self.state[1])
-            val = d[_val]
-            self.state = val, self.state[1]
-            yield self.p.set_parameter([self.collection, self.name, self.state])
-            # HACK: avoid having to save parameters to registry through server
-            # why do we even use the registry??
-            yield self.r.cd("", "Servers", "Parameter Vault", self.collection)
-            yield self.r.set(self.name, (self.editor, self.state))
+        _val = self.currentText()
+        if _val == "":
+            return
+        d = dict((x, y) for y, x in self.state[1])
+        val = d[_val]
+        self.state = val, self.state[1]
+        self.writer.write(self.collection, self.name, self.state, (self.editor, self.state))
 
     def update_value(self, val):
         if self.state[0] == val[0]:
@@ -788,14 +682,11 @@ class ParameterSelectionEditor(QtWidgets.QDoubleSpinBox, BaseEditor):
         else:
             return False
 
-    @inlineCallbacks
     def on_param_changed_locally(self, val):
         U_val = U(val, self.units)
-        if self.check_connection(self.acxn) and self.check_bounds(val):
+        if self.check_bounds(val):
             self.state[-1] = U_val
-            yield self.p.set_parameter([self.collection, self.name, U_val])
-            yield self.r.cd("", "Servers", "Parameter Vault", self.collection)
-            yield self.r.set(self.name, (self.editor, self.state))
+            self.writer.write(self.collection, self.name, U_val, (self.editor, self.state))
         else:
             try:
                 self.setValue(self.state[-1][self.units])
@@ -859,7 +750,6 @@ class IntListEditor(BaseEditor):
         else:
             return True
 
-    @inlineCallbacks
     def on_param_changed_locally(self, newval):
         try:
             sender = self.sender()
@@ -867,15 +757,12 @@ class IntListEditor(BaseEditor):
         except (AttributeError, ValueError):
             obj_idx = 0
         val = [int(widget.value()) for widget in self.widgets]
-        if self.check_connection(self.acxn) and self.check_bounds(val):
-            yield self.p.set_parameter([self.collection, self.name, val])
-            yield self.r.cd("", "Servers", "Parameter Vault", self.collection)
-            yield self.r.set(self.name, (self.editor, val))
+        if self.check_bounds(val):
+            self.writer.write(self.collection, self.name, val, (self.editor, val))
             self.state[obj_idx] = newval
         else:
             sender.setValue(self.state[obj_idx])
 
-    @inlineCallbacks
     def update_value(self, val):
         if list(self.state) == list(val):
             return
@@ -888,13 +775,6 @@ class IntListEditor(BaseEditor):
         else:
             self.refreshsignal.emit(list(val))
         self.state = val
-        if self.r is not None:
-            yield self.r.cd("", "Servers", "Parameter Vault", self.collection)
-            yield self.r.set(self.name, (self.editor, val))
-        else:
-            self.r = yield self.acxn.get_server("registry")
-            yield self.r.cd("", "Servers", "Parameter Vault", self.collection)
-            yield self.r.set(self.name, (self.editor, val))
 
     def refresh_widgets(self, val):
         for widget in self.widgets:
@@ -921,3 +801,50 @@ SelectionSimpleEditor.register()
 LineSelectionEditor.register()
 ParameterSelectionEditor.register()
 IntListEditor.register()
+
+
+class ParameterDelegate(QtWidgets.QStyledItemDelegate):
+    """Creates the editor of a parameter value only while it is edited. The
+    editors write the parameters to the Parameter Vault themselves, closing
+    them commits their state to the model with set_value."""
+    def __init__(self, acxn, node, set_value):
+        QtWidgets.QStyledItemDelegate.__init__(self)
+        self.acxn = acxn
+        self.node = node
+        self.set_value = set_value
+        # Open editors, by (collection, parameter)
+        self.editors = dict()
+
+    def createEditor(self, parent, option, index):
+        node = self.node(index)
+        if node.value is None:
+            return None
+        editor = EditorFactory.get_editor(node.value, self.acxn, node.key, None)
+        if editor is None:
+            return None
+        editor.setParent(parent)
+        editor.setAutoFillBackground(True)
+        self.editors[node.key] = editor
+        return editor
+
+    def setEditorData(self, editor, index):
+        # Editors are made from the current value, later changes of the
+        # parameter are passed to update_value by refresh_values
+        pass
+
+    def setModelData(self, editor, model, index):
+        node = self.node(index)
+        if isinstance(editor, QtWidgets.QAbstractSpinBox):
+            # Values typed without pressing enter
+            editor.interpretText()
+        state = editor.isChecked() if isinstance(editor, BoolEditor) else editor.state
+        self.set_value(node.key, (node.value[0], state))
+
+    def updateEditorGeometry(self, editor, option, index):
+        editor.setGeometry(option.rect)
+
+    def destroyEditor(self, editor, index):
+        for key, open_editor in list(self.editors.items()):
+            if open_editor is editor:
+                del self.editors[key]
+        QtWidgets.QStyledItemDelegate.destroyEditor(self, editor, index)
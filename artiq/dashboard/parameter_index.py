@@ -0,0 +1,130 @@
+"""
+Index of the commonly used parameters: the "Collection.parameter" strings
+that the classes of the files under ~/artiq-work have as class attributes,
+as subsequences declare the parameters they use.
+
+Files are parsed with ast instead of being imported, so no experiment code
+is run. The parameters found in every file are cached with its modification
+time, size and hash, so later scans only parse new or modified files.
+"""
+import ast
+import hashlib
+import json
+import logging
+import os
+import threading
+from PyQt5 import QtCore
+from artiq.tools import get_user_config_dir
+
+
+logger = logging.getLogger(__name__)
+work_folder = os.path.join(os.path.expanduser("~"), "artiq-work")
+
+
+def is_parameter(value):
+    return isinstance(value, str) and len(value.split(".")) == 2
+
+
+def class_parameters(source, filename="<unknown>"):
+    """Parameters that the top-level classes of the source have as string
+    class attributes."""
+    parameters = []
+    for node in ast.parse(source, filename).body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        for statement in node.body:
+            if isinstance(statement, (ast.Assign, ast.AnnAssign)) and statement.value:
+                try:
+                    value = ast.literal_eval(statement.value)
+                except Exception:
+                    continue
+                if is_parameter(value):
+                    parameters.append(value)
+    return parameters
+
+
+class ParameterIndex(QtCore.QObject):
+    """Scans a directory for commonly used parameters in a background thread
+    and emits updated with all of them when they differ from the cached
+    ones."""
+    updated = QtCore.pyqtSignal(list)
+
+    def __init__(self, directory=work_folder, index_file=None):
+        QtCore.QObject.__init__(self)
+        self.directory = directory
+        if index_file is None:
+            index_file = os.path.join(get_user_config_dir(), "parameter_index.json")
+        self.index_file = index_file
+        self.thread = None
+        try:
+            with open(index_file, "r") as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = dict()
+
+    def parameters(self):
+        """Parameters of the last scan, or of the cache before it ends,
+        without duplicates."""
+        parameters = dict()
+        for entry in self.index.values():
+            parameters.update(dict.fromkeys(entry["parameters"]))
+        return list(parameters)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.scan, daemon=True)
+        self.thread.start()
+
+    def read_entry(self, path, entry):
+        stat = os.stat(path)
+        if (entry is not None and entry["mtime"] == stat.st_mtime_ns and
+                entry["size"] == stat.st_size):
+            return entry
+        with open(path, "rb") as f:
+            source = f.read()
+        digest = hashlib.sha1(source).hexdigest()
+        if entry is None or entry["sha1"] != digest:
+            try:
+                parameters = class_parameters(source, path)
+            except (SyntaxError, ValueError):
+                parameters = []
+            entry = {"parameters": parameters}
+        return dict(entry, mtime=stat.st_mtime_ns, size=stat.st_size, sha1=digest)
+
+    def scan(self):
+        previous = self.parameters()
+        index = dict()
+        for root, _, files in os.walk(self.directory):
+            for file_ in sorted(files):
+                if not file_.endswith(".py"):
+                    continue
+                path = os.path.join(root, file_)
+                try:
+                    index[path] = self.read_entry(path, self.index.get(path))
+                except OSError:
+                    continue
+        self.index = index
+        self.save()
+        parameters = self.parameters()
+        if parameters != previous:
+            self.updated.emit(parameters)
+
+    def save(self):
+        tmp = self.index_file + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self.index, f)
+            os.replace(tmp, self.index_file)
+        except OSError:
+            logger.warning("Couldn't write parameter index.", exc_info=True)
+
+
+_index = None
+
+
+def get_parameter_index():
+    """The shared parameter index, which starts scanning on first use."""
+    global _index
+    if _index is None:
+        _index = ParameterIndex()
+        _index.start()
+    return _index
@@ -0,0 +1,278 @@
+"""
+Model of the parameter editor tree: regions, holding collections, holding
+parameters, whose values are the (editor, state) pairs of the Parameter
+Vault registry. Views only paint the rows that are visible, and editors are
+created by the parameter editor's delegate for the cell being edited, so
+the tree scales to many thousands of parameters.
+"""
+from collections import defaultdict
+from PyQt5 import QtCore, QtGui
+
+
+class treeNode:
+    __slots__ = ("name", "parent", "children", "row", "key", "value")
+
+    def __init__(self, name, parent=None, key=None, value=None):
+        self.name = name
+        self.parent = parent
+        self.children = []
+        self.row = 0
+        # (collection, parameter) and (editor, state) of parameters
+        self.key = key
+        self.value = value
+
+    def insert(self, row, nodes):
+        self.children[row:row] = nodes
+        for i in range(row, len(self.children)):
+            self.children[i].row = i
+
+
+def display_value(value):
+    """Text of a parameter value for when it isn't being edited."""
+    editor, state = value
+    try:
+        if editor == "parameter":
+            val = state[2]
+            units = getattr(val, "units", "")
+            number = val[units] if units else val
+            return "{:.5f} {}".format(float(number), units.replace("u", "µ")).strip()
+        if editor == "selection_simple":
+            return str(state[0])
+        if editor == "line_selection":
+            return str(dict(state[1]).get(state[0], state[0]))
+        if editor == "int_list":
+            return ", ".join(str(int(i)) for i in state)
+        if editor == "bool":
+            return ""
+    except (TypeError, ValueError, IndexError, KeyError):
+        pass
+    return str(state)
+
+
+def updated_state(value, new):
+    """State of a parameter with value after the Parameter Vault reported
+    its new value."""
+    editor, state = value
+    if editor == "parameter":
+        state[-1] = new
+        return state
+    if editor == "bool":
+        return bool(new)
+    if editor in ("selection_simple", "line_selection"):
+        return (new[0] if isinstance(new, tuple) else new), state[1]
+    return new
+
+
+class searchIndex:
+    """Trigram index of "collection.parameter" names for substring search
+    that only looks at the names sharing all trigrams of the query."""
+    def __init__(self):
+        self.names = dict()
+        self.postings = defaultdict(set)
+
+    def add(self, key):
+        if key in self.names:
+            return
+        name = ".".join(key).lower()
+        self.names[key] = name
+        for i in range(len(name) - 2):
+            self.postings[name[i:i + 3]].add(key)
+
+    def search(self, text):
+        """Keys whose names contain text, ignoring case."""
+        text = text.lower()
+        if len(text) < 3:
+            candidates = self.names
+        else:
+            postings = sorted((self.postings.get(text[i:i + 3], set())
+                               for i in range(len(text) - 2)), key=len)
+            candidates = set.intersection(*postings)
+        return set(key for key in candidates if text in self.names[key])
+
+
+class ParameterTreeModel(QtCore.QAbstractItemModel):
+    region_color = QtGui.QColor(192, 192, 192)
+    collection_color = QtGui.QColor(248, 248, 248)
+    parameter_colors = QtGui.QColor(248, 248, 248), QtGui.QColor(228, 228, 228)
+
+    def __init__(self, editors):
+        QtCore.QAbstractItemModel.__init__(self)
+        # Names of the editors that parameters can have
+        self.editors = editors
+        self.root = treeNode(None)
+        self.regions = set()
+        self.params = defaultdict(list)
+        self.search_index = searchIndex()
+        self.bold = QtGui.QFont()
+        self.bold.setBold(True)
+
+    def node(self, index):
+        return index.internalPointer() if index.isValid() else self.root
+
+    def index_of(self, node, column=0):
+        if node is self.root:
+            return QtCore.QModelIndex()
+        return self.createIndex(node.row, column, node)
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        node = self.node(parent)
+        if not 0 <= row < len(node.children):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column, node.children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        return self.index_of(index.internalPointer().parent)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return len(self.node(parent).children)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 2
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+            return ("Collection", "Value")[section]
+        return None
+
+    def flags(self, index):
+        node = self.node(index)
+        if node.key is None:
+            return QtCore.Qt.ItemIsEnabled
+        flags = QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+        if index.column() == 1:
+            flags |= QtCore.Qt.ItemIsEditable
+        return flags
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        node = self.node(index)
+        column = index.column()
+        if role == QtCore.Qt.DisplayRole:
+            if column == 0:
+                return node.name
+            if node.value is not None:
+                return display_value(node.value)
+        elif role == QtCore.Qt.CheckStateRole:
+            if column == 1 and node.value is not None and node.value[0] == "bool":
+                return QtCore.Qt.Checked if node.value[1] else QtCore.Qt.Unchecked
+        elif role == QtCore.Qt.FontRole:
+            if node.key is None:
+                return self.bold
+        elif role == QtCore.Qt.BackgroundRole:
+            if node in self.regions:
+                return self.region_color
+            if node.key is not None and column == 0:
+                return self.parameter_colors[node.row % 2]
+            return self.collection_color
+        elif role == QtCore.Qt.SizeHintRole:
+            if node.key is not None:
+                return QtCore.QSize(-1, 15)
+        return None
+
+    def add_region(self, name):
+        node = treeNode(name, self.root)
+        self.beginInsertRows(QtCore.QModelIndex(), len(self.root.children),
+                             len(self.root.children))
+        self.root.insert(len(self.root.children), [node])
+        self.endInsertRows()
+        self.regions.add(node)
+        return node
+
+    def set_collection(self, parent, collection, values):
+        """Adds the collection, or replaces it, to the parent region, or to
+        the top level with parent None, with the parameters of values that
+        have an editor. Returns its node, or None without parameters."""
+        parent = self.root if parent is None else parent
+        for child in parent.children:
+            if child.name == collection:
+                self.remove(child)
+                break
+        node = treeNode(collection, parent)
+        for param in sorted(values):
+            value = values[param]
+            if (type(value) != tuple or len(value) != 2 or
+                    value[0] not in self.editors):
+                # Unrecognized registry key format, ignore
+                continue
+            key = collection, param
+            node.children.append(treeNode(param, node, key, value))
+        if not node.children:
+            return None
+        node.insert(0, [])
+        row = 0
+        while row < len(parent.children) and parent.children[row].name < collection:
+            row += 1
+        self.beginInsertRows(self.index_of(parent), row, row)
+        parent.insert(row, [node])
+        self.endInsertRows()
+        for child in node.children:
+            self.params[child.key].append(child)
+            self.search_index.add(child.key)
+        return node
+
+    def remove(self, node):
+        parent = node.parent
+        self.beginRemoveRows(self.index_of(parent), node.row, node.row)
+        del parent.children[node.row]
+        parent.insert(node.row, [])
+        self.endRemoveRows()
+        for child in node.children:
+            self.params[child.key].remove(child)
+
+    def clear(self, parent):
+        for node in list(parent.children):
+            self.remove(node)
+
+    def collections(self, parent=None):
+        parent = self.root if parent is None else parent
+        return dict((node.name, node) for node in parent.children)
+
+    def set_value(self, key, value):
+        """Sets the (editor, state) value of the parameter in every region,
+        only repainting its value cells."""
+        for node in self.params.get(key, ()):
+            node.value = value
+            index = self.index_of(node, 1)
+            self.dataChanged.emit(index, index)
+
+    def update_parameter(self, key, new):
+        nodes = self.params.get(key)
+        if nodes:
+            editor, _ = nodes[0].value
+            self.set_value(key, (editor, updated_state(nodes[0].value, new)))
+
+
+class ParameterFilterModel(QtCore.QSortFilterProxyModel):
+    """Shows the parameters whose "collection.parameter" names contain the
+    filter text, found with the search index of the source model."""
+    def __init__(self, source):
+        QtCore.QSortFilterProxyModel.__init__(self)
+        self.setSourceModel(source)
+        self.matches = None
+        self.matched_collections = None
+
+    def set_filter(self, text):
+        if text:
+            self.matches = self.sourceModel().search_index.search(text)
+            self.matched_collections = set(key[0] for key in self.matches)
+        else:
+            self.matches = self.matched_collections = None
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, row, parent):
+        if self.matches is None:
+            return True
+        source = self.sourceModel()
+        node = source.node(parent).children[row]
+        if node.key is not None:
+            return node.key in self.matches
+        if node in source.regions:
+            return True
+        return (node.name in self.matched_collections and
+                any(child.key in self.matches for child in node.children))
+
+    def node(self, index):
+        return self.sourceModel().node(self.mapToSource(index))
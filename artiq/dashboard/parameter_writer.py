@@ -0,0 +1,120 @@
+"""
+Coalesced writes of the parameters changed in the parameter editor.
+
+Editors used to write every change of their value to the Parameter Vault and
+to the registry, so scrolling a spin box through 50 values made 100 writes
+and 50 parameter changed signals, each of them fetched again by every
+listening dock. Editors now hand their changes to the ParameterWriter of
+their connection, which writes the last value of every parameter changed
+within an interval, all of them with one request packet to each server.
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from twisted.internet import defer
+from twisted.internet.defer import inlineCallbacks
+from artiq.dashboard.parameter_cache import get_parameter_cache
+from artiq.dashboard.registry_loader import vault_path
+
+
+logger = logging.getLogger(__name__)
+write_interval = 0.2
+# Seconds the dashboard waits on exit for the pending changes to be written
+exit_timeout = 5.
+
+
+class ParameterWriter:
+    """Writes parameters with the LabRAD connection acxn at most every
+    interval seconds, the first change of an interval being written at its
+    end. The written values are passed to the ParameterCache cache, if any,
+    so that it doesn't fetch them."""
+    def __init__(self, acxn, interval=write_interval, clock=None, cache=None):
+        self.acxn = acxn
+        self.cache = cache
+        if cache is not None:
+            cache.writers.append(self)
+        self.interval = interval
+        if clock is None:
+            from twisted.internet import reactor as clock
+        self.clock = clock
+        self.pending = OrderedDict()
+        # Parameters being written, with the number of their writes
+        self.in_flight = dict()
+        self.call = None
+        self.context = None
+        self.changes = self.requests = 0
+
+    def write(self, collection, name, value, registry_value):
+        """Writes value to the Parameter Vault and registry_value, the
+        (editor, state) pair of the parameter, to the registry."""
+        self.pending[collection, name] = value, registry_value
+        self.changes += 1
+        if self.call is None:
+            self.call = self.clock.callLater(self.interval, self.flush)
+
+    def busy(self, key):
+        """Whether the parameter has changes that aren't written yet, so
+        that values of the Parameter Vault are older than the editor's."""
+        return key in self.pending or key in self.in_flight
+
+    @inlineCallbacks
+    def flush(self):
+        """Writes the pending changes now."""
+        if self.call is not None and self.call.active():
+            self.call.cancel()
+        self.call = None
+        pending, self.pending = self.pending, OrderedDict()
+        if not pending:
+            return
+        for key in pending:
+            self.in_flight[key] = self.in_flight.get(key, 0) + 1
+        try:
+            vault = yield self.acxn.get_server("ParameterVault")
+            registry = yield self.acxn.get_server("registry")
+            if self.context is None:
+                # The registry keeps the current directory per context
+                self.context = yield self.acxn.context()
+            p = vault.packet()
+            r = registry.packet(context=self.context)
+            for (collection, name), (value, registry_value) in pending.items():
+                p.set_parameter([collection, name, value])
+                r.cd(vault_path + [collection])
+                r.set(name, registry_value)
+            self.requests += 2
+            yield defer.gatherResults([p.send(), r.send()], consumeErrors=True)
+            written = True
+        except Exception:
+            logger.warning("Failed to write parameters %s",
+                           ", ".join(".".join(key) for key in pending), exc_info=True)
+            written = False
+        for key in pending:
+            self.in_flight[key] -= 1
+            if not self.in_flight[key]:
+                del self.in_flight[key]
+        if written and self.cache is not None:
+            for key, (value, _) in pending.items():
+                if not self.busy(key):
+                    self.cache.update(key, value)
+
+
+_writers = dict()
+
+
+def get_parameter_writer(acxn):
+    """The ParameterWriter shared by the editors of the connection acxn."""
+    if acxn not in _writers:
+        _writers[acxn] = ParameterWriter(acxn, cache=get_parameter_cache(acxn))
+    return _writers[acxn]
+
+
+async def flush_parameter_writers(timeout=exit_timeout):
+    """Writes the pending changes of all ParameterWriters, waiting at most
+    timeout seconds. The dashboard calls it on exit."""
+    loop = asyncio.get_event_loop()
+    flushes = [writer.flush().asFuture(loop) for writer in _writers.values()]
+    if not flushes:
+        return
+    try:
+        await asyncio.wait_for(asyncio.gather(*flushes), timeout)
+    except asyncio.TimeoutError:
+        logger.warning("Timed out writing the changed parameters on exit")
@@ -4,13 +4,11 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 from artiq import __artiq_dir__ as artiq_dir
 from artiq.dashboard.readout_histograms import (pmt_readout_dock,
                                                 camera_readout_dock)
+from artiq.dashboard.parameter_cache import get_parameter_cache
 from twisted.internet.defer import inlineCallbacks
 from labrad.wrappers import connectAsync
 
 
-parameterchangedID = 612512
-
-
 class ReadoutHistograms(QtWidgets.QMainWindow):
     def __init__(self, acxn=None, smgr=None):
         self.acxn = acxn
@@ -20,6 +18,7 @@ class ReadoutHistograms(QtWidgets.QMainWindow):
         self.resize(140*qfm.averageCharWidth(), 38*qfm.lineSpacing())
         self.exit_request = asyncio.Event()
         self.add_docks(self.acxn)
+        get_parameter_cache(self.acxn).changed.connect(self.param_changed)
         self.setup_listeners()
 
     def closeEvent(self, event):
@@ -38,11 +37,7 @@ class ReadoutHistograms(QtWidgets.QMainWindow):
 
     @inlineCallbacks
     def setup_listeners(self):
-        context = yield self.acxn.context()
-        p = yield self.acxn.get_server("ParameterVault")
-        yield p.signal__parameter_change(parameterchangedID, context=context)
-        yield p.addListener(listener=self.param_changed, source=None, 
-                            ID=parameterchangedID, context=context)
+        yield get_parameter_cache(self.acxn).listen()
 
     def add_docks(self, cxn):
         self.d_pmt = pmt_readout_dock.PMTReadoutDock(cxn)
@@ -57,14 +52,13 @@ class ReadoutHistograms(QtWidgets.QMainWindow):
         self.d_pmt.raise_()
 
     @inlineCallbacks
-    def param_changed(self, *args):
+    def param_changed(self, key, lines):
         # Should maybe do this in pmt_readout_dock code
-        if "".join(args[1]) == "StateReadoutthreshold_list":
+        if key == ("StateReadout", "threshold_list"):
             d = self.d_pmt
-            p = yield self.acxn.get_server("ParameterVault")
-            lines = yield p.get_parameter(["StateReadout", "threshold_list"])
             slines = sorted(lines)
             if not list(slines) == list(lines):
+                p = yield self.acxn.get_server("ParameterVault")
                 yield p.set_parameter(["StateReadout", "threshold_list", lines])
             d.number_lines = len(lines)
             for line in d.lines: 
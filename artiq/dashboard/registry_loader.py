@@ -0,0 +1,214 @@
+"""
+Bulk loading of the Parameter Vault collections of the LabRAD registry.
+
+    python -m artiq.dashboard.registry_loader --collections 40 --params 25
+
+Every collection is read with two request packets, one listing its keys and
+one getting all of them, instead of a get request per key. The
+collections are loaded concurrently, each in its own context since the
+registry keeps the current directory per context. Run as a script, the
+per-key and the bulk loading are timed against LocalRegistry, an in-process
+stand-in for the registry with a simulated round-trip time.
+"""
+import argparse
+import itertools
+import logging
+import time
+from twisted.internet import defer, task
+from twisted.internet.defer import inlineCallbacks, returnValue
+
+
+logger = logging.getLogger(__name__)
+vault_path = ["", "Servers", "Parameter Vault"]
+
+
+class RegistryLoader:
+    """Loads Parameter Vault collections from registry, an asynchronous
+    LabRAD registry server, in contexts made by context."""
+    def __init__(self, registry, context):
+        self.registry = registry
+        self.context = context
+
+    @inlineCallbacks
+    def send(self, path, calls=(), context=None):
+        """Sends one packet that changes to path, lists it and makes the
+        calls, (setting, argument) pairs. Returns the (subdirectories, keys)
+        of path and the list of results of the calls."""
+        p = self.registry.packet(context=context)
+        p.cd(path)
+        p.dir(key="dir")
+        for i, (setting, argument) in enumerate(calls):
+            p[setting](argument, key="call {}".format(i))
+        ans = yield p.send()
+        returnValue((ans["dir"], [ans["call {}".format(i)] for i in range(len(calls))]))
+
+    @inlineCallbacks
+    def collections(self):
+        context = yield self.context()
+        (collections, _), _ = yield self.send(vault_path, context=context)
+        returnValue(list(collections))
+
+    @inlineCallbacks
+    def load_collection(self, collection, params=None):
+        """Values of the params of the collection, of all of them with
+        params None. Params that aren't in the registry are left out."""
+        context = yield self.context()
+        path = vault_path + [collection]
+        (_, keys), _ = yield self.send(path, context=context)
+        keys = [key for key in keys if params is None or key in params]
+        _, values = yield self.send(path, [("get", key) for key in keys], context)
+        returnValue(dict(zip(keys, values)))
+
+    def load(self, collections, callback, params=None):
+        """Loads the collections concurrently and calls callback(collection,
+        values) as each of them arrives. params maps collections to the
+        params to load, all of them by default. Returns a Deferred that
+        fires once all collections are loaded."""
+        deferreds = []
+        for collection in collections:
+            d = self.load_collection(collection, None if params is None else params[collection])
+            d.addCallback(lambda values, collection=collection: callback(collection, values))
+            d.addErrback(lambda failure, collection=collection: logger.warning(
+                "Failed to load parameters of %s: %s", collection, failure.getErrorMessage()))
+            deferreds.append(d)
+        return defer.DeferredList(deferreds)
+
+
+class localPacket:
+    def __init__(self, registry, context):
+        self.registry = registry
+        self.context = context
+        self.records = []
+
+    def __getitem__(self, setting):
+        def call(*args, key=None):
+            self.records.append((setting, args, key or setting))
+            return self
+        return call
+
+    def __getattr__(self, setting):
+        if setting.startswith("_"):
+            raise AttributeError(setting)
+        return self[setting]
+
+    def send(self):
+        return self.registry.request(self.context, self.records)
+
+
+class LocalRegistry:
+    """In-process stand-in for the LabRAD registry, holding a tree of nested
+    dicts, that answers every request packet after latency seconds."""
+    def __init__(self, tree, latency=1e-3, clock=None):
+        self.tree = tree
+        self.latency = latency
+        if clock is None:
+            from twisted.internet import reactor as clock
+        self.clock = clock
+        self.contexts = itertools.count(1)
+        self.paths = dict()
+        self.requests = 0
+
+    def context(self):
+        return (0, next(self.contexts))
+
+    def packet(self, context=None):
+        return localPacket(self, context)
+
+    def cd(self, path, context=None):
+        return self.packet(context).cd(path).send().addCallback(lambda ans: ans["cd"])
+
+    def dir(self, context=None):
+        return self.packet(context).dir().send().addCallback(lambda ans: ans["dir"])
+
+    def get(self, key, context=None):
+        return self.packet(context).get(key).send().addCallback(lambda ans: ans["get"])
+
+    def request(self, context, records):
+        self.requests += 1
+        return task.deferLater(self.clock, self.latency, self.answer, context, records)
+
+    def answer(self, context, records):
+        ans = dict()
+        for setting, args, key in records:
+            node = self.tree
+            for name in self.paths.get(context, [""])[1:]:
+                node = node[name]
+            if setting == "cd":
+                self.paths[context] = list(args[0])
+                ans[key] = args[0]
+            elif setting == "dir":
+                ans[key] = (sorted(k for k, v in node.items() if isinstance(v, dict)),
+                            sorted(k for k, v in node.items() if not isinstance(v, dict)))
+            elif setting == "get":
+                ans[key] = node[args[0]]
+            elif setting == "set":
+                node[args[0]] = args[1]
+                ans[key] = None
+            else:
+                raise ValueError("Unknown setting " + setting)
+        return ans
+
+
+def make_tree(collections, params):
+    vault = {"Collection{}".format(i): {"param{}".format(j): ("parameter", [0., 1., .5])
+                                        for j in range(params)}
+             for i in range(collections)}
+    return {"Servers": {"Parameter Vault": vault}}
+
+
+@inlineCallbacks
+def load_per_key(registry):
+    """Loads every parameter as make_GUI did, with a get request each."""
+    yield registry.cd(vault_path)
+    collections, _ = yield registry.dir()
+    values = dict()
+    for collection in collections:
+        yield registry.cd(vault_path + [collection])
+        _, params = yield registry.dir()
+        values[collection] = dict()
+        for param in params:
+            values[collection][param] = yield registry.get(param)
+    returnValue(values)
+
+
+@inlineCallbacks
+def load_bulk(registry):
+    loader = RegistryLoader(registry, registry.context)
+    collections = yield loader.collections()
+    values = dict()
+    yield loader.load(collections, values.__setitem__)
+    returnValue(values)
+
+
+def get_argparser():
+    parser = argparse.ArgumentParser(description="Parameter Vault registry loading benchmark")
+    parser.add_argument("--collections", type=int, default=40,
+                        help="number of collections (default: %(default)s)")
+    parser.add_argument("--params", type=int, default=25,
+                        help="parameters per collection (default: %(default)s)")
+    parser.add_argument("--latency", type=float, default=1e-3,
+                        help="round-trip time of a request in seconds (default: %(default)s)")
+    return parser
+
+
+@inlineCallbacks
+def benchmark(reactor, args):
+    tree = make_tree(args.collections, args.params)
+    results = []
+    for name, load in (("per key", load_per_key), ("bulk", load_bulk)):
+        registry = LocalRegistry(tree, args.latency, reactor)
+        start = time.perf_counter()
+        values = yield load(registry)
+        results.append(values)
+        print("{:8s} {:6d} requests {:9.3f} s".format(name, registry.requests,
+                                                      time.perf_counter() - start))
+    assert results[0] == results[1]
+
+
+def main():
+    args = get_argparser().parse_args()
+    task.react(benchmark, [args])
+
+
+if __name__ == "__main__":
+    main()
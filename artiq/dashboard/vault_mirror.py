@@ -0,0 +1,321 @@
+"""
+Mirror of the Parameter Vault, served to experiments.
+
+    python -m artiq.dashboard.vault_mirror
+
+Experiments used to download every parameter of the Parameter Vault in
+prepare, with a request per parameter, even when nothing had changed since
+the previous experiment. The mirror downloads them once and keeps them up to
+date from the parameter changed signal, fetching the changed parameters
+with one request packet. Experiments read a snapshot of all parameters with
+a single connection to the Unix socket of the mirror, and fall back to the
+Parameter Vault when the mirror isn't running.
+
+Snapshots carry the session of the mirror, which is new every time the
+mirror starts, and a version that increases with every change, so that data
+files can record which parameters they were taken with. A snapshot is
+pickled once per version, as labrad values can't be sent as PYON. As
+unpickling runs code, the socket is only accessible to its user, and
+experiments only read snapshots from a socket of their own user. Snapshots
+are only served once the parameters named by the signal are fetched, so an
+experiment never gets parameters older than the signals the mirror received.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import pickle
+import stat
+import socket
+import struct
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from labrad.types import Error
+from artiq.dashboard.drift_tracker import client_config as dt_config
+
+
+logger = logging.getLogger(__name__)
+parameterchangedID = 612512
+serverconnectID = 612513
+mirror_socket = dt_config.vault_mirror_socket
+# Seconds the mirror waits for changed parameters to be fetched before it
+# closes the connection without a snapshot, less than the timeout of
+# get_snapshot
+snapshot_wait = 0.5
+
+
+def get_snapshot(path=mirror_socket, timeout=1.):
+    """The latest snapshot of the mirror listening on the Unix socket at
+    path, a dict with the session, the version and the parameters, by
+    collection. Raises OSError when the mirror isn't running, isn't up to
+    date or its socket isn't owned by the user."""
+    if os.stat(path).st_uid != os.getuid():
+        raise PermissionError("Vault mirror socket {} isn't owned by the user".format(path))
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        data = bytearray()
+        while True:
+            chunk = sock.recv(2**20)
+            if not chunk:
+                break
+            data += chunk
+    if len(data) < 8:
+        raise ConnectionError("Vault mirror has no snapshot")
+    length, = struct.unpack(">Q", data[:8])
+    if len(data) != 8 + length:
+        raise ConnectionError("Truncated snapshot from vault mirror")
+    return pickle.loads(data[8:])
+
+
+def get_parameters(p, keys):
+    """Values of the (collection, name) keys from the Parameter Vault p,
+    with one request packet. Broken parameters, for which the vault returns
+    an error, are left out. Errors of the connection are raised, also when
+    none of the keys are returned and the vault doesn't answer anymore."""
+    packet = p.packet()
+    for i, key in enumerate(keys):
+        packet.get_parameter(list(key), key="get {}".format(i))
+    try:
+        ans = packet.send()
+        return dict((key, ans["get {}".format(i)]) for i, key in enumerate(keys))
+    except Error as e:
+        # Subclasses of Error, like RequestTimeoutError, are raised by the
+        # connection rather than sent by the vault
+        if type(e) is not Error:
+            raise
+        if len(keys) == 1:
+            logger.warning("Parameter Vault failed to get %s: %s", ".".join(keys[0]), e.msg)
+            return dict()
+    values = dict()
+    for key in keys:
+        values.update(get_parameters(p, [key]))
+    if not values:
+        # Raises if the vault is gone rather than the parameters broken
+        p.get_collections()
+    return values
+
+
+def download(p):
+    """All parameters of the Parameter Vault p, by collection."""
+    parameters = dict()
+    for collection in p.get_collections():
+        keys = [(collection, name) for name in p.get_parameter_names(collection)]
+        parameters[collection] = dict((name, value) for (_, name), value
+                                      in get_parameters(p, keys).items())
+    return parameters
+
+
+def load_parameters(cxn, path=mirror_socket):
+    """Parameters, by collection, from the mirror listening on the Unix
+    socket at path if it runs, else from the Parameter Vault of the LabRAD
+    connection cxn, with the (session, version) of the snapshot, None
+    without one."""
+    try:
+        snapshot = get_snapshot(path)
+    except (OSError, pickle.UnpicklingError) as e:
+        logger.info("No vault mirror (%s), loading parameters from the Parameter Vault", e)
+        return download(cxn.parametervault), None
+    return snapshot["parameters"], (snapshot["session"], snapshot["version"])
+
+
+class vaultMirror:
+    """Parameters of the Parameter Vault of the LabRAD connection cxn. The
+    changed parameters are fetched by a background thread. Everything is
+    downloaded again when the Parameter Vault restarts, and after errors,
+    every retry seconds until it succeeds. Meanwhile there is no snapshot."""
+    def __init__(self, cxn, retry=10.):
+        self.cxn = cxn
+        self.retry = retry
+        self.session = uuid.uuid4().hex
+        self.version = 0
+        self.parameters = None
+        self.snapshot = None
+        self.source = None
+        self.subscribed = False
+        self.stale = OrderedDict()
+        # Whether changed parameters are being fetched
+        self.fetching = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.fetch_loop, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def listen(self):
+        if not self.subscribed:
+            self.cxn.manager.subscribe_to_named_message("Server Connect", serverconnectID, True)
+            self.cxn._backend.cxn.addListener(self.on_server_connect, source=self.cxn.manager.ID,
+                                              ID=serverconnectID)
+            self.subscribed = True
+        # The Parameter Vault may have restarted, with a new ID
+        self.cxn.refresh()
+        p = self.cxn.parametervault
+        p.signal__parameter_change(parameterchangedID)
+        if p.ID != self.source:
+            # Listeners are called in the reactor thread of the connection
+            self.cxn._backend.cxn.addListener(self.on_parameter_change, source=p.ID,
+                                              context=self.cxn._ctx, ID=parameterchangedID)
+            self.source = p.ID
+
+    def on_server_connect(self, *args):
+        if args[1][1] == "Parameter Vault":
+            with self.condition:
+                self.parameters = self.snapshot = None
+                self.condition.notify_all()
+
+    def on_parameter_change(self, *args):
+        key = tuple(args[1][:2])
+        with self.condition:
+            self.stale[key] = None
+            self.condition.notify_all()
+
+    def up_to_date(self):
+        return self.parameters is None or not (self.stale or self.fetching)
+
+    def get_snapshot(self, timeout=0.):
+        """Pickled snapshot with its length, once the changed parameters
+        are fetched, waiting at most timeout seconds for them, or None."""
+        with self.condition:
+            if not self.condition.wait_for(self.up_to_date, timeout):
+                return None
+            if self.parameters is None:
+                return None
+            if self.snapshot is None:
+                data = pickle.dumps({"session": self.session, "version": self.version,
+                                     "parameters": self.parameters},
+                                    pickle.HIGHEST_PROTOCOL)
+                self.snapshot = struct.pack(">Q", len(data)) + data
+            return self.snapshot
+
+    def reload(self):
+        # Listen before downloading, so that no change is missed. Changes
+        # signalled during the download may not be in it, so they stay
+        # stale and are fetched again.
+        self.listen()
+        with self.condition:
+            self.stale.clear()
+        parameters = download(self.cxn.parametervault)
+        with self.condition:
+            self.parameters = parameters
+            self.version += 1
+            self.snapshot = None
+        logger.info("Loaded %d parameters, version %d",
+                    sum(len(d) for d in parameters.values()), self.version)
+
+    def fetch(self):
+        with self.condition:
+            while not self.stale and self.parameters is not None:
+                self.condition.wait()
+            if self.parameters is None:
+                return
+            keys, self.stale = list(self.stale), OrderedDict()
+            self.fetching = True
+        try:
+            values = get_parameters(self.cxn.parametervault, keys)
+        finally:
+            with self.condition:
+                self.fetching = False
+                self.condition.notify_all()
+        with self.condition:
+            # Broken parameters keep their previous value
+            if self.parameters is None or not values:
+                return
+            for (collection, name), value in values.items():
+                self.parameters.setdefault(collection, dict())[name] = value
+            self.version += 1
+            self.snapshot = None
+        logger.debug("Updated %d parameters, version %d", len(values), self.version)
+
+    def fetch_loop(self):
+        while True:
+            try:
+                if self.parameters is None:
+                    self.reload()
+                self.fetch()
+            except Exception:
+                logger.warning("Lost the Parameter Vault, reloading in %g s",
+                               self.retry, exc_info=True)
+                with self.condition:
+                    self.parameters = self.snapshot = None
+                    self.condition.notify_all()
+                time.sleep(self.retry)
+
+
+class mirrorServer:
+    """Sends the latest snapshot of the mirror to every connecting client,
+    waiting at most wait seconds for the mirror to be up to date, or closes
+    the connection without a snapshot."""
+    def __init__(self, mirror, wait=snapshot_wait):
+        self.mirror = mirror
+        self.wait = wait
+        self.server = None
+        self.path = None
+
+    async def start(self, path):
+        """Listens on a Unix socket at path, only accessible to the user."""
+        # Remove the socket left behind by a mirror that didn't stop
+        try:
+            if stat.S_ISSOCK(os.stat(path).st_mode):
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+        umask = os.umask(0o177)
+        try:
+            self.server = await asyncio.start_unix_server(self.handle, path)
+        finally:
+            os.umask(umask)
+        self.path = path
+
+    async def handle(self, reader, writer):
+        try:
+            # Wait in a thread, so that other clients are served meanwhile
+            snapshot = await asyncio.get_event_loop().run_in_executor(
+                None, self.mirror.get_snapshot, self.wait)
+            if snapshot is not None:
+                writer.write(snapshot)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def get_argparser():
+    parser = argparse.ArgumentParser(description="Parameter Vault mirror")
+    parser.add_argument("--socket", default=mirror_socket,
+                        help="Unix socket for experiments (default: %(default)s)")
+    return parser
+
+
+def main():
+    import labrad
+    logging.basicConfig(level=logging.INFO)
+    args = get_argparser().parse_args()
+    mirror = vaultMirror(labrad.connect())
+    mirror.start()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    server = mirrorServer(mirror)
+    loop.run_until_complete(server.start(args.socket))
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(server.stop())
+        loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -26,6 +26,7 @@ from artiq.dashboard.laser_room.laser_room_tab import LaserRoomTab
 from artiq.dashboard.drift_tracker.drift_tracker import DriftTracker
 #from artiq.dashboard.readout_histograms.readout_histograms import ReadoutHistograms
 from artiq.dashboard.pulse_sequence.pulse_sequence_tab import PulseSequenceTab
+from artiq.dashboard.parameter_writer import flush_parameter_writers
 #import labrad
 from lattice.clients.connection import connection
 #from labrad import connection
@@ -226,6 +227,8 @@ def main():
     d_pmt = pmt_control.PMTControlDock(acxn)
     smgr.register(d_pmt)
     d_parameter_editor = parameter_editor.ParameterEditorDock(acxn=acxn)
+    # Write the parameter changes the editors haven't written yet
+    atexit_register_coroutine(flush_parameter_writers)
     smgr.register(d_parameter_editor)
     needs_parameter_vault.append(d_parameter_editor)
     d_explorer = explorer.ExplorerDock(expmgr, None,
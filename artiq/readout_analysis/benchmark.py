@@ -0,0 +1,191 @@
+'''
+benchmarks of the readout analysis on synthetic data
+
+    python -m artiq.readout_analysis.benchmark -o results.json
+    python -m artiq.readout_analysis.benchmark -b results.json
+
+Every case is timed over a parameter grid and the best time per call is written as JSON.
+Given a baseline file, cases that got slower than the tolerance are reported and the
+exit status is nonzero.
+'''
+import argparse
+import json
+import platform
+import sys
+import time
+import warnings
+import numpy as np
+from artiq.readout_analysis import readouts, synthetic
+from artiq.readout_analysis.ion_counter import ion_counter
+
+
+def time_call(function, repeats, min_time = 0.05):
+    '''
+    returns the best time per call of function, called in loops of at least min_time seconds
+    '''
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for i in range(loops):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or loops >= 1e6:
+            break
+        loops *= 10
+    best = elapsed / loops
+    for i in range(repeats - 1):
+        start = time.perf_counter()
+        for j in range(loops):
+            function()
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best
+
+
+def pmt_simple_cases(quick):
+    for ion_number in (1, 2, 5):
+        for repetitions in ((100, 1000) if quick else (100, 1000, 10000)):
+            for readout_mode in ('pmt', 'pmt_parity'):
+                counts, states = synthetic.pmt_counts(repetitions, ion_number)
+                threshold = ','.join(str(int(2 + 25 * (k + .5))) for k in range(ion_number))
+                params = dict(ion_number = ion_number, repetitions = repetitions, readout_mode = readout_mode)
+                yield params, lambda: readouts.pmt_simple(counts, threshold, readout_mode)
+
+
+def camera_ion_probabilities_cases(quick):
+    for ion_number in ((1, 3) if quick else (1, 3, 6)):
+        for detection_mode in ('chi_square', 'weighted'):
+            for readout_mode in ('camera', 'camera_states'):
+                p = synthetic.camera_parameters(ion_number)
+                p.state_detection_mode = detection_mode
+                images, states = synthetic.chain_frames(100, ion_number, bright = 0.5)
+                params = dict(ion_number = ion_number, repetitions = 100, state_detection_mode = detection_mode,
+                              readout_mode = readout_mode)
+                yield params, lambda: readouts.camera_ion_probabilities(images.ravel(), 100, p, readout_mode)
+
+
+def fitting_error_state_cases(quick):
+    for ion_number in ((2, 4) if quick else (2, 4, 8)):
+        for frames in (10, 100):
+            for crosstalk in (0., 0.05):
+                fitter, shape = readouts.camera_fitter(synthetic.camera_parameters(ion_number))
+                images, states = synthetic.chain_frames(frames, ion_number, bright = 0.5, crosstalk = crosstalk)
+                params = dict(ion_number = ion_number, frames = frames, crosstalk = crosstalk)
+                yield params, lambda: fitter.fitting_error_state(fitter.all_state_combinations, images)
+
+
+def guess_parameters_and_fit_cases(quick):
+    for ion_number in ((1, 3) if quick else (1, 3, 5)):
+        for background in (2., 10.):
+            fitter, shape = readouts.camera_fitter(synthetic.camera_parameters(ion_number, background = background))
+            images, states = synthetic.chain_frames(100, ion_number, background = background)
+            image = images.mean(axis = 0)
+            yy, xx = np.mgrid[0:shape[0], 0:shape[1]]
+            params = dict(ion_number = ion_number, background = background)
+            yield params, lambda: fitter.guess_parameters_and_fit(xx, yy, image)
+
+
+def state_utility_cases(quick):
+    for ion_number in (2, 4, 8):
+        images, states = synthetic.chain_frames(100, ion_number, bright = 0.5)
+        probabilities = readouts.get_states_camera(states, ion_number)
+        params = dict(ion_number = ion_number, repetitions = 100)
+        yield dict(params, function = 'get_states_camera'), lambda: readouts.get_states_camera(states, ion_number)
+        yield dict(params, function = 'Calc_parity'), lambda: readouts.Calc_parity(probabilities)
+
+
+def ion_counter_cases(quick):
+    counter = ion_counter()
+    for ion_number in ((1, 10) if quick else (1, 10, 20)):
+        images, states = synthetic.chain_frames(1000, ion_number, shape = (20, 30 + 10 * ion_number),
+                                                spacing = 6. + 0.3 * ion_number)
+        params = dict(ion_number = ion_number, frames = 1000)
+        yield params, lambda: counter.count(images)
+
+
+suite = {
+    'pmt_simple': pmt_simple_cases,
+    'camera_ion_probabilities': camera_ion_probabilities_cases,
+    'fitting_error_state': fitting_error_state_cases,
+    'guess_parameters_and_fit': guess_parameters_and_fit_cases,
+    'state_utilities': state_utility_cases,
+    'ion_counter': ion_counter_cases,
+    }
+
+
+def case_name(benchmark, params):
+    return benchmark + '[' + ','.join('{}={}'.format(key, value) for key, value in sorted(params.items())) + ']'
+
+
+def run(benchmarks = None, repeats = 3, quick = False):
+    results = {}
+    for benchmark in benchmarks or suite:
+        for params, function in suite[benchmark](quick):
+            name = case_name(benchmark, params)
+            with warnings.catch_warnings():
+                #zero pixels give infinite chi square, as with real camera data
+                warnings.simplefilter('ignore', RuntimeWarning)
+                seconds = time_call(function, repeats)
+            results[name] = dict(benchmark = benchmark, params = params, seconds = seconds)
+            print('{:90s} {:12.6f} ms'.format(name, seconds * 1e3))
+    return dict(
+            meta = dict(python = platform.python_version(), numpy = np.__version__,
+                        machine = platform.machine(), node = platform.node(), time = time.time()),
+            results = results,
+            )
+
+
+def compare(results, baseline, tolerance):
+    '''
+    prints the ratio of the time of every case to the baseline and returns the regressed cases
+    '''
+    regressions = []
+    for name, result in sorted(results['results'].items()):
+        if name not in baseline['results']:
+            continue
+        ratio = result['seconds'] / baseline['results'][name]['seconds']
+        flag = ''
+        if ratio > 1 + tolerance:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 / (1 + tolerance):
+            flag = '  improved'
+        print('{:90s} {:8.2f}x{}'.format(name, ratio, flag))
+    return regressions
+
+
+def get_argparser():
+    parser = argparse.ArgumentParser(description="Readout analysis benchmarks")
+    parser.add_argument("-o", "--output", default=None,
+                        help="write the results as JSON to this file")
+    parser.add_argument("-b", "--baseline", default=None,
+                        help="compare the results to this JSON file")
+    parser.add_argument("-t", "--tolerance", type=float, default=0.2,
+                        help="relative slowdown reported as a regression (default: %(default)s)")
+    parser.add_argument("-r", "--repeats", type=int, default=3,
+                        help="number of timing repeats per case (default: %(default)s)")
+    parser.add_argument("-q", "--quick", action="store_true",
+                        help="run a reduced parameter grid")
+    parser.add_argument("benchmarks", nargs="*",
+                        help="benchmarks to run, out of {} (default: all)".format(", ".join(suite)))
+    return parser
+
+
+def main():
+    parser = get_argparser()
+    args = parser.parse_args()
+    for benchmark in args.benchmarks:
+        if benchmark not in suite:
+            parser.error("unknown benchmark: " + benchmark)
+    results = run(args.benchmarks, args.repeats, args.quick)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
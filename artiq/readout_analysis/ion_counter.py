@@ -0,0 +1,112 @@
+'''
+headless ion counting on stacks of camera frames
+
+Works like ion_state_detector.integrate_image_vertically, but on all frames at once and without
+plotting, so it can be used inside loading and chain-check loops.
+'''
+import time
+import numpy as np
+from scipy.ndimage import maximum_filter1d
+
+
+class ion_counter(object):
+
+    def __init__(self, threshold = 0.4, min_dist = 2, min_signal = 200):
+        '''
+        threshold is the peak height relative to the highest column of a frame, as in peakutils.indexes
+
+        peaks closer than min_dist columns to a higher peak are dropped, frames whose projection stays
+        below min_signal are taken to have no ions
+        '''
+        self.threshold = threshold
+        self.min_dist = min_dist
+        self.min_signal = min_signal
+        self.background = None
+
+    def set_background(self, frames):
+        '''
+        caches the column projection of frames without ions, which is then subtracted instead of
+        the minimum of every projection
+        '''
+        frames = np.asarray(frames, dtype = float)
+        if frames.ndim == 2:
+            frames = frames[None]
+        self.background = frames.sum(axis = 1).mean(axis = 0)
+
+    def clear_background(self):
+        self.background = None
+
+    def projections(self, frames):
+        '''
+        background subtracted column sums of every frame
+        '''
+        frames = np.asarray(frames, dtype = float)
+        if frames.ndim == 2:
+            frames = frames[None]
+        projection = frames.sum(axis = 1)
+        if self.background is not None and self.background.shape == projection.shape[1:]:
+            projection = projection - self.background
+        else:
+            projection = projection - projection.min(axis = 1, keepdims = True)
+        return projection
+
+    def count(self, frames):
+        '''
+        returns the number of ions, their positions in (subpixel) columns padded with nan and a
+        confidence for every frame
+
+        the confidence is 1 - (highest rejected local maximum) / (lowest accepted peak), or
+        1 - (highest local maximum) / (threshold level) for frames without ions
+        '''
+        projection = self.projections(frames)
+        n_frames, n_columns = projection.shape
+        #a peak is the first column of the highest value within min_dist on both sides
+        local_max = projection == maximum_filter1d(projection, 2 * self.min_dist + 1, axis = 1, mode = 'nearest')
+        local_max[:, 1:] &= projection[:, 1:] > projection[:, :-1]
+        high = projection.max(axis = 1, keepdims = True)
+        low = projection.min(axis = 1, keepdims = True)
+        level = low + self.threshold * (high - low)
+        peaks = local_max & (projection >= level) & (high > self.min_signal)
+        counts = peaks.sum(axis = 1)
+
+        lowest_peak = np.where(peaks, projection, np.inf).min(axis = 1)
+        rejected = np.where(local_max & ~peaks, projection, -np.inf).max(axis = 1)
+        reference = np.where(counts > 0, lowest_peak, np.maximum(level[:, 0], self.min_signal))
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            confidence = 1 - np.maximum(rejected, 0) / reference
+        confidence = np.clip(np.nan_to_num(confidence, nan = 1.), 0, 1)
+
+        positions = np.full((n_frames, max(counts.max(initial = 0), 1)), np.nan)
+        frame, column = np.nonzero(peaks)
+        if frame.size:
+            left = projection[frame, np.maximum(column - 1, 0)]
+            center = projection[frame, column]
+            right = projection[frame, np.minimum(column + 1, n_columns - 1)]
+            curvature = left - 2 * center + right
+            with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                offset = np.where(curvature < 0, 0.5 * (left - right) / curvature, 0.)
+            #peaks are returned in row-major order, so the rank within a frame is a running index
+            rank = np.arange(frame.size) - np.searchsorted(frame, frame)
+            positions[frame, rank] = column + offset
+        return counts, positions, confidence
+
+
+def benchmark(frames = 1000, ion_numbers = (1, 5, 10, 20), repeats = 5):
+    '''
+    prints the number of frames per second counted on synthetic chain images
+    '''
+    from artiq.readout_analysis.synthetic import chain_frames
+    counter = ion_counter()
+    for ion_number in ion_numbers:
+        images, states = chain_frames(frames, ion_number, shape = (20, 30 + 10 * ion_number),
+                                      spacing = 6. + 0.3 * ion_number)
+        start = time.perf_counter()
+        for i in range(repeats):
+            counts, positions, confidence = counter.count(images)
+        elapsed = (time.perf_counter() - start) / repeats
+        print("{:3d} ions: {:10.0f} frames/s, correct count in {:.1%} of frames".format(
+                    ion_number, frames / elapsed, np.mean(counts == states.sum(axis = 1))))
+
+
+if __name__ == "__main__":
+    benchmark()
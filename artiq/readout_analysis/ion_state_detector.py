@@ -2,17 +2,24 @@ import numpy as np
 import lmfit
 from artiq.readout_analysis.equilibrium_positions import position_dict
 from functools import reduce
+from concurrent.futures import ThreadPoolExecutor
+from scipy.special import erfc
 import peakutils
 
 from multiprocessing import Process
 
 class ion_state_detector(object):
 
-    def __init__(self, ion_number):
+    def __init__(self, ion_number, memory_budget = 256 * 2**20, threads = 1):
         self.ion_number = ion_number
+        self.memory_budget = memory_budget #bytes of intermediates in the exhaustive state comparison
+        self.threads = threads
         self.all_state_combinations = self.all_combinations_0_1(ion_number)
         self.spacing_dict = position_dict[ion_number] #provides relative spacings of all the ions
         self.fitted_gaussians, self.background = None, None
+        self.weights = None
+        self.thresholds, self.misclassification = None, None
+        self.bright_mean, self.dark_mean = None, None
 
     def integrate_image_vertically(self, data, threshold):
         # sum image vertically
@@ -47,6 +54,7 @@ class ion_state_detector(object):
     def set_fitted_parameters(self, params, xx, yy):
         self.fitted_gaussians = self.ion_gaussians(params, xx, yy)
         self.background = params['background_level'].value
+        self.weights = None
 
     def gaussian_2D(self, xx, yy, x_center, y_center, sigma_x, sigma_y, amplitude):
         '''
@@ -115,18 +123,73 @@ class ion_state_detector(object):
 
     def fitting_error_state(self, selection, image):
         '''
+        compares every image to the model of every selected state and returns the state with the
+        lowest chi square together with the confidence 1 - lowest / second lowest chi square.
+
+        images and states are processed in blocks such that the intermediates of all
+        self.threads worker threads stay within self.memory_budget bytes, reducing each
+        block on the fly. image blocks are spread over the worker threads.
         '''
-        sum_selected_gaussians = self.background + np.tensordot(selection, self.fitted_gaussians, axes = (1, 0))
-        sum_selected_gaussians = sum_selected_gaussians[:, None, :, :]
-        image_size = float(image.shape[1] * image.shape[2])
-        chi_sq = (sum_selected_gaussians - image)**2 / image / image_size
-        chi_sq = chi_sq.sum(axis = (2,3))
-        best_states = selection[np.argmin(chi_sq, axis = 0)]
-        sorted_chi = np.sort(chi_sq, axis = 0)
-        lowest_chi,second_lowest_chi = sorted_chi[0:2]
+        n_states, n_images = selection.shape[0], image.shape[0]
+        pixels = image.shape[1] * image.shape[2]
+        threads = max(1, self.threads)
+        worker_budget = self.memory_budget // threads
+        #per state of a block, the model image (sum_selected_gaussians) is alive together
+        #with the difference and its square for every image of the block
+        image_block = (worker_budget // (8 * pixels * n_states) - 1) // 2
+        #at least one block for every thread
+        image_block = int(min(-(-n_images // threads), max(1, image_block)))
+        state_block = int(min(n_states, max(1, worker_budget // (8 * pixels * (2 * image_block + 1)))))
+        best_index = np.empty(n_images, dtype = int)
+        lowest_chi = np.empty(n_images)
+        second_lowest_chi = np.empty(n_images)
+
+        def process(start):
+            stop = min(start + image_block, n_images)
+            index, lowest = self.fitting_error_block(selection, image[start:stop], state_block)
+            best_index[start:stop] = index
+            lowest_chi[start:stop], second_lowest_chi[start:stop] = lowest
+
+        starts = range(0, n_images, image_block)
+        if threads > 1 and len(starts) > 1:
+            with ThreadPoolExecutor(threads) as executor:
+                list(executor.map(process, starts))
+        else:
+            for start in starts:
+                process(start)
+        best_states = selection[best_index]
         confidence = 1 - lowest_chi / second_lowest_chi
         return best_states, confidence
 
+    def fitting_error_block(self, selection, image, state_block):
+        '''
+        returns the index of the state with the lowest chi square and the two lowest chi square
+        values of every image, iterating over the states in blocks of state_block
+        '''
+        image_size = float(image.shape[1] * image.shape[2])
+        best_index = np.zeros(image.shape[0], dtype = int)
+        best_chi = np.full(image.shape[0], np.nan)
+        #nan sorts last, so the placeholders are only kept if there are less than two states
+        lowest = np.full((2, image.shape[0]), np.nan)
+        columns = np.arange(image.shape[0])
+        for start in range(0, selection.shape[0], state_block):
+            block = selection[start:start + state_block]
+            sum_selected_gaussians = self.background + np.tensordot(block, self.fitted_gaussians, axes = (1, 0))
+            sum_selected_gaussians = sum_selected_gaussians[:, None, :, :]
+            chi_sq = (sum_selected_gaussians - image)**2 / image / image_size
+            chi_sq = chi_sq.sum(axis = (2,3))
+            #keep the first minimum like argmin over all states, where a nan counts as the minimum
+            index = np.argmin(chi_sq, axis = 0)
+            chi = chi_sq[index, columns]
+            if start == 0:
+                update = np.ones(image.shape[0], dtype = bool)
+            else:
+                update = (chi < best_chi) | (np.isnan(chi) & ~np.isnan(best_chi))
+            best_index[update] = index[update] + start
+            best_chi[update] = chi[update]
+            lowest = np.partition(np.concatenate((lowest, chi_sq)), 1, axis = 0)[0:2]
+        return best_index, lowest
+
     def guess_parameters_and_fit(self, xx, yy, data):
         params = lmfit.Parameters()
         background_guess = data[0].mean() #assumes that there are no ions at the edge of the image
@@ -209,6 +272,112 @@ class ion_state_detector(object):
         state, confidence = self.fitting_error_state(self.all_state_combinations, image)
         return state, confidence
 
+    def matched_filter_weights(self):
+        '''
+        returns a (N, y, x) array of per-ion weights, the fitted gaussian footprint of
+        each ion normalized such that an isolated bright ion gives a weighted count equal to
+        its total number of photons
+        '''
+        if self.fitted_gaussians is None:
+            raise Exception("Fitted parameters not provided")
+        if self.weights is None:
+            footprint = self.fitted_gaussians.sum(axis = (1,2))
+            footprint_sq = (self.fitted_gaussians**2).sum(axis = (1,2))
+            self.weights = self.fitted_gaussians * (footprint / footprint_sq)[:, None, None]
+        return self.weights
+
+    def weighted_counts(self, image):
+        '''
+        background subtracted, matched filter photon counts of every ion
+
+        returns a (images, N) array
+        '''
+        weights = self.matched_filter_weights()
+        if image.ndim == 2:
+            image = image.reshape((1, image.shape[0],image.shape[1]))
+        counts = np.tensordot(image, weights, axes = ((1,2), (1,2)))
+        return counts - self.background * weights.sum(axis = (1,2))
+
+    def calibrate_thresholds(self, bright_images, dark_images = None):
+        '''
+        determines a threshold on the weighted counts of every ion from reference images with
+        all ions bright and all ions dark.
+
+        the threshold of each ion is chosen to minimize the misclassification rate of the reference
+        data, averaged over bright and dark. If no dark images are provided, the dark counts
+        are modelled as background shot noise only. Ions are bright above their threshold, so
+        the candidates for a bright sample lie just below it.
+
+        returns the thresholds and the estimated misclassification rate of every ion
+        '''
+        bright = np.sort(self.weighted_counts(bright_images), axis = 0)
+        if dark_images is None:
+            weights = self.matched_filter_weights()
+            dark_std = np.sqrt(self.background * (weights**2).sum(axis = (1,2)))
+            dark = None
+        else:
+            dark = np.sort(self.weighted_counts(dark_images), axis = 0)
+        self.thresholds = np.empty(self.ion_number)
+        self.misclassification = np.empty(self.ion_number)
+        for i in range(self.ion_number):
+            #fraction of bright images below and dark images above each candidate threshold
+            below_bright = np.nextafter(bright[:, i], -np.inf)
+            if dark is None:
+                candidates = below_bright
+                dark_error = 0.5 * erfc(candidates / (np.sqrt(2) * dark_std[i]))
+            else:
+                candidates = np.concatenate((below_bright, dark[:, i]))
+                dark_error = 1 - np.searchsorted(dark[:, i], candidates, side = 'right') / float(dark.shape[0])
+            bright_error = np.searchsorted(bright[:, i], candidates, side = 'right') / float(bright.shape[0])
+            error = (bright_error + dark_error) / 2
+            best = np.argmin(error)
+            self.thresholds[i] = candidates[best]
+            self.misclassification[i] = error[best]
+        self.bright_mean = bright.mean(axis = 0)
+        self.dark_mean = np.zeros(self.ion_number) if dark is None else dark.mean(axis = 0)
+        return self.thresholds, self.misclassification
+
+    def model_thresholds(self):
+        '''
+        thresholds estimated from the fitted model alone, approximating the weighted counts of
+        bright and dark ions as gaussian with the shot noise of the ion and the background
+
+        returns the thresholds and the estimated misclassification rate of every ion
+        '''
+        weights = self.matched_filter_weights()
+        bright_mean = self.fitted_gaussians.sum(axis = (1,2))
+        dark_std = np.sqrt(self.background * (weights**2).sum(axis = (1,2)))
+        bright_std = np.sqrt((weights**2 * (self.background + self.fitted_gaussians)).sum(axis = (1,2)))
+        #equal number of standard deviations from the bright and the dark level
+        self.thresholds = bright_mean * dark_std / (bright_std + dark_std)
+        self.misclassification = 0.5 * erfc(bright_mean / (bright_std + dark_std) / np.sqrt(2))
+        self.bright_mean, self.dark_mean = bright_mean, np.zeros(self.ion_number)
+        return self.thresholds, self.misclassification
+
+    def set_thresholds(self, thresholds):
+        '''
+        sets previously calibrated thresholds. The bright level is taken from the fitted amplitude.
+        '''
+        self.thresholds = np.asarray(thresholds, dtype = float)
+        self.bright_mean = self.fitted_gaussians.sum(axis = (1,2))
+        self.dark_mean = np.zeros(self.ion_number)
+
+    def weighted_state_detection(self, image):
+        '''
+        determines which ions are currently bright by thresholding the weighted counts of every ion
+
+        the confidence of an image is the smallest distance of any ion to its threshold,
+        relative to half the separation of the bright and dark levels
+        '''
+        if self.thresholds is None:
+            raise Exception("Thresholds not calibrated")
+        counts = self.weighted_counts(image)
+        state = (counts > self.thresholds).astype(int)
+        half_separation = np.abs(self.bright_mean - self.dark_mean) / 2
+        margin = np.abs(counts - self.thresholds) / half_separation
+        confidence = np.clip(margin.min(axis = 1), 0, 1)
+        return state, confidence
+
     def report(self, params):
         lmfit.report_errors(params)
 
@@ -0,0 +1,98 @@
+'''
+online calibration of PMT thresholds
+
+The photon counts of an N-ion chain are modelled as a mixture of N + 1 Poissonians with means
+background + k * bright_rate for k = 0...N bright ions. The mixture is fit by expectation
+maximization on an exponentially decaying histogram of all counts seen so far, so every update
+costs the same regardless of how many counts have already been consumed.
+'''
+import numpy as np
+from scipy.special import logsumexp
+from scipy.stats import poisson
+
+
+class online_threshold_calibrator(object):
+
+    def __init__(self, ion_number, initial_thresholds = None, decay = 0.98, iterations = 5):
+        '''
+        initial_thresholds, if given, seeds the mixture, e.g. with the current StateReadout.threshold_list
+
+        decay is the weight every previous count keeps when a new block is added
+        '''
+        self.ion_number = ion_number
+        self.decay = decay
+        self.iterations = iterations
+        self.levels = np.arange(ion_number + 1)
+        self.histogram = np.zeros(0)
+        self.weights = np.full(ion_number + 1, 1. / (ion_number + 1))
+        self.background, self.bright_rate = None, None
+        if initial_thresholds is not None:
+            thresholds = sorted(float(x) for x in initial_thresholds)
+            #thresholds lie about halfway between neighbouring levels
+            self.bright_rate = max(thresholds[-1] / (ion_number - 0.5), 1.0)
+            self.background = max(thresholds[0] - self.bright_rate / 2, 0.5)
+
+    def update(self, counts):
+        '''
+        adds a block of raw counts and refines the fit
+        '''
+        counts = np.asarray(counts, dtype = float)
+        counts = counts[np.isfinite(counts)].astype(int)
+        if not counts.size:
+            return
+        new = np.bincount(counts, minlength = self.histogram.size).astype(float)
+        new[:self.histogram.size] += self.decay * self.histogram
+        self.histogram = new
+        if self.background is None:
+            self.initial_guess()
+        for i in range(self.iterations):
+            self.expectation_maximization()
+
+    def initial_guess(self):
+        cumulative = np.cumsum(self.histogram) / self.histogram.sum()
+        low, high = np.searchsorted(cumulative, [0.05, 0.95])
+        self.background = max(float(low), 0.5)
+        self.bright_rate = max((high - self.background) / self.ion_number, 1.0)
+
+    def means(self):
+        return self.background + self.levels * self.bright_rate
+
+    def expectation_maximization(self):
+        n = np.arange(self.histogram.size)[:, None]
+        means = self.means()
+        log_likelihood = n * np.log(means) - means + np.log(self.weights)
+        responsibilities = np.exp(log_likelihood - logsumexp(log_likelihood, axis = 1, keepdims = True))
+        responsibilities *= self.histogram[:, None]
+        total = responsibilities.sum(axis = 0)
+        self.weights = np.maximum(total / total.sum(), 1e-6)
+        #one newton step for the background and the bright rate of the constrained means
+        residual = responsibilities * (n / means - 1)
+        curvature = (responsibilities * n / means**2).sum(axis = 0)
+        gradient = np.array([residual.sum(), (residual * self.levels).sum()])
+        hessian = np.array([
+                    [curvature.sum(), (curvature * self.levels).sum()],
+                    [(curvature * self.levels).sum(), (curvature * self.levels**2).sum()]
+                    ])
+        try:
+            step = np.linalg.solve(hessian, gradient)
+        except np.linalg.LinAlgError:
+            return
+        self.background = max(self.background + step[0], 1e-3)
+        self.bright_rate = max(self.bright_rate + step[1], 1.0)
+
+    def thresholds(self):
+        '''
+        returns the integer thresholds between neighbouring levels, counts equal to a threshold
+        belong to the lower level
+        '''
+        means = self.means()
+        crossing = (means[1:] - means[:-1]) / np.log(means[1:] / means[:-1])
+        return [int(x) for x in np.floor(crossing)]
+
+    def fidelity(self):
+        '''
+        returns the probability that a count of every level falls between its thresholds
+        '''
+        bounds = np.array([-1] + self.thresholds() + [np.inf])
+        means = self.means()
+        return poisson.cdf(bounds[1:], means) - poisson.cdf(bounds[:-1], means)
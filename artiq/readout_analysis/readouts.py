@@ -78,12 +78,12 @@ def get_states_PMT(readouts):
 def calc_parity_PMT():
     pass
 
-def camera_ion_probabilities(images, repetitions, p, readout_mode = 'camera'):
+def camera_fitter(p):
     """
-    Method for analyzing camera images. For an
-    N-ion chain, returns an N element list
-    indicating the probability that each
-    ion is excited.
+    Builds an ion_state_detector from the fitted reference
+    image parameters stored in the IonsOnCamera collection.
+    Returns the detector and the (y_pixels, x_pixels) shape
+    of a single image.
     """
     from lmfit import Parameters as lmfit_Parameters
 
@@ -114,6 +114,36 @@ def camera_ion_probabilities(images, repetitions, p, readout_mode = 'camera'):
 
     x_pixels = int( (image_region[3] - image_region[2] + 1.) / (image_region[0]) )
     y_pixels = int( (image_region[5] - image_region[4] + 1.) / (image_region[1]) )
+    return fitter, (y_pixels, x_pixels)
+
+def calibrate_camera_thresholds(bright_images, dark_images, p):
+    """
+    Calibrates the per-ion thresholds of the weighted
+    detection mode from reference images with all ions
+    bright and all ions dark (dark_images may be None).
+    Returns the thresholds and the estimated
+    misclassification rate of every ion.
+    """
+    fitter, shape = camera_fitter(p)
+    bright_images = np.reshape(bright_images, (-1,) + shape)
+    if dark_images is not None:
+        dark_images = np.reshape(dark_images, (-1,) + shape)
+    return fitter.calibrate_thresholds(bright_images, dark_images)
+
+def camera_ion_probabilities(images, repetitions, p, readout_mode = 'camera'):
+    """
+    Method for analyzing camera images. For an
+    N-ion chain, returns an N element list
+    indicating the probability that each
+    ion is excited.
+
+    p.state_detection_mode selects between the full
+    chi-square template comparison ('chi_square', default)
+    and thresholded matched filter counts ('weighted'),
+    which uses p.weighted_thresholds when set and
+    thresholds from the fitted model otherwise.
+    """
+    fitter, (y_pixels, x_pixels) = camera_fitter(p)
     #print "inside the camera readout"
     #print "x_pixels {}".format(x_pixels)
     #print "y_pixels {}".format(y_pixels)
@@ -122,7 +152,17 @@ def camera_ion_probabilities(images, repetitions, p, readout_mode = 'camera'):
     #print "repetitions{}".format(repetitions)
 
     images = np.reshape(images, (repetitions, y_pixels, x_pixels))
-    readouts, confidences = fitter.state_detection(images)
+    if getattr(p, 'state_detection_mode', 'chi_square') == 'weighted':
+        thresholds = getattr(p, 'weighted_thresholds', None)
+        if thresholds is not None and len(thresholds):
+            if isinstance(thresholds, str):
+                thresholds = [float(x) for x in thresholds.split(',')]
+            fitter.set_thresholds(thresholds)
+        else:
+            fitter.model_thresholds()
+        readouts, confidences = fitter.weighted_state_detection(images)
+    else:
+        readouts, confidences = fitter.state_detection(images)
 
     ion_state = 1 - readouts.mean(axis = 0)
     #np.save('temp_camera_ion_state', ion_state)
@@ -0,0 +1,69 @@
+'''
+deterministic synthetic readout data for benchmarks
+'''
+from types import SimpleNamespace
+import numpy as np
+from artiq.readout_analysis.equilibrium_positions import position_dict
+
+
+def random_states(random, samples, ion_number, bright):
+    if bright is None:
+        return np.ones((samples, ion_number), dtype = int)
+    return (random.random_sample((samples, ion_number)) < bright).astype(int)
+
+
+def pmt_counts(repetitions, ion_number, background = 2., bright_rate = 25., bright = 0.5, seed = 0):
+    '''
+    returns poissonian PMT counts of repetitions readouts of ion_number ions and the
+    (repetitions, ion_number) array of bright ions used to generate them
+    '''
+    random = np.random.RandomState(seed)
+    states = random_states(random, repetitions, ion_number, bright)
+    return random.poisson(background + bright_rate * states.sum(axis = 1)), states
+
+
+def chain_frames(frames, ion_number, shape = (20, 60), spacing = 6., sigma = 1.2, amplitude = 100.,
+                 background = 5., bright = None, crosstalk = 0., seed = 0):
+    '''
+    returns a (frames, y, x) stack of poissonian camera images of a horizontal ion chain centered in the image
+    and the (frames, ion_number) array of bright ions used to generate them
+
+    bright defaults to all ions bright, if it is a fraction every ion is bright with this probability
+
+    crosstalk is the fraction of the brightness of every bright ion that also appears on each of its neighbours
+    '''
+    random = np.random.RandomState(seed)
+    yy, xx = np.mgrid[0:shape[0], 0:shape[1]]
+    center_x, center_y = (shape[1] - 1) / 2., (shape[0] - 1) / 2.
+    footprints = np.empty((ion_number,) + shape)
+    for i, position in enumerate(position_dict[ion_number]):
+        x = center_x + spacing * position
+        footprints[i] = amplitude * np.exp(-((xx - x)**2 + (yy - center_y)**2) / (2 * sigma**2))
+    states = random_states(random, frames, ion_number, bright)
+    brightness = states.astype(float)
+    brightness[:, 1:] += crosstalk * states[:, :-1]
+    brightness[:, :-1] += crosstalk * states[:, 1:]
+    expected = background + np.tensordot(brightness, footprints, axes = (1, 0))
+    return random.poisson(expected).astype(float), states
+
+
+def camera_parameters(ion_number, shape = (20, 60), spacing = 6., sigma = 1.2, amplitude = 100., background = 5.):
+    '''
+    returns IonsOnCamera parameters matching the images of chain_frames
+    '''
+    return SimpleNamespace(
+                ion_number = ion_number,
+                horizontal_bin = 1,
+                vertical_bin = 1,
+                horizontal_min = 0,
+                horizontal_max = shape[1] - 1,
+                vertical_min = 0,
+                vertical_max = shape[0] - 1,
+                fit_background_level = background,
+                fit_amplitude = amplitude,
+                fit_rotation_angle = 0.,
+                fit_center_horizontal = (shape[1] - 1) / 2.,
+                fit_center_vertical = (shape[0] - 1) / 2.,
+                fit_spacing = spacing,
+                fit_sigma = sigma,
+                )